@@ -0,0 +1,155 @@
+"""Build-free static asset pipeline.
+
+``build`` copies the JavaScript and CSS under ``static/`` to ``static/dist/``
+with a content hash in their names, so they can be cached forever, plus
+precompressed ``.gz`` (and ``.br`` when the optional ``brotli`` package is
+installed) siblings. Relative ES module imports are rewritten to the hashed
+names of their targets, and local CSS ``@import``s are inlined into one file
+(files starting with ``_`` are partials and only exist inlined). It returns a
+manifest mapping source paths (``js/main.js``) to hashed ones
+(``js/main.3f2a9c1b7d4e.js``), which is also written to ``dist/manifest.json``.
+
+Outputs are content-addressed and written atomically, so several workers can
+build at the same time.
+"""
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+import tempfile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DIST_DIR = 'dist'
+SOURCE_EXTENSIONS = ('.js', '.css')
+# Encodings of the precompressed siblings, in order of preference
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+JS_IMPORT = re.compile(r'''((?:\bimport|\bfrom)\s*\(?\s*['"])(\.{1,2}/[^'"]+)(['"])''')
+CSS_IMPORT = re.compile(r'''@import\s+(?:url\(\s*(?P<q1>['"]?)(?P<url1>.*?)(?P=q1)\s*\)|(?P<q2>['"])(?P<url2>.*?)(?P=q2))\s*;''')
+
+
+def _write(path, data):
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+
+
+def _compressed(data):
+    yield '.gz', gzip.compress(data, 9, mtime=0)
+    if brotli is not None:
+        yield '.br', brotli.compress(data)
+
+
+class _Builder:
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self.dist = os.path.join(static_folder, DIST_DIR)
+        self.manifest = {}
+        self.in_progress = set()
+
+    def read(self, rel):
+        with open(os.path.join(self.static_folder, rel), 'rb') as f:
+            return f.read().decode('utf-8')
+
+    def emit(self, rel):
+        if rel in self.manifest:
+            return self.manifest[rel]
+        if rel in self.in_progress:
+            raise ValueError(f'Import cycle through {rel} cannot be content-hashed')
+        self.in_progress.add(rel)
+        if rel.endswith('.js'):
+            data = self.rewrite_js(rel)
+        else:
+            data = self.bundle_css(rel)
+        data = data.encode('utf-8')
+
+        root, ext = posixpath.splitext(rel)
+        hashed = f'{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+        path = os.path.join(self.dist, *hashed.split('/'))
+        _write(path, data)
+        for suffix, compressed in _compressed(data):
+            if len(compressed) < len(data):
+                _write(path + suffix, compressed)
+        self.manifest[rel] = hashed
+        return hashed
+
+    def rewrite_js(self, rel):
+        directory = posixpath.dirname(rel)
+
+        def hashed_import(match):
+            target = posixpath.normpath(posixpath.join(directory, match.group(2)))
+            relative = posixpath.relpath(self.emit(target), directory)
+            if not relative.startswith('.'):
+                relative = './' + relative
+            return match.group(1) + relative + match.group(3)
+
+        return JS_IMPORT.sub(hashed_import, self.read(rel))
+
+    def bundle_css(self, rel):
+        remote = []
+        body = self.inline_css(rel, remote, set())
+        # @import is only valid before any other rule, so remote ones move to the top
+        return ''.join(f'@import url({url!r});\n' for url in remote) + body
+
+    def inline_css(self, rel, remote, seen):
+        directory = posixpath.dirname(rel)
+
+        def inline(match):
+            url = match.group('url1') or match.group('url2')
+            if '://' in url or url.startswith('//'):
+                if url not in remote:
+                    remote.append(url)
+                return ''
+            target = posixpath.normpath(posixpath.join(directory, url))
+            if target in seen:
+                return ''
+            seen.add(target)
+            return self.inline_css(target, remote, seen)
+
+        return CSS_IMPORT.sub(inline, self.read(rel))
+
+
+def build(static_folder):
+    """Emit hashed and precompressed copies of the static assets; return the manifest."""
+    builder = _Builder(static_folder)
+    for directory, subdirectories, files in os.walk(static_folder):
+        if os.path.abspath(directory) == os.path.abspath(builder.dist):
+            subdirectories[:] = []
+            continue
+        for name in sorted(files):
+            if name.endswith(SOURCE_EXTENSIONS) and not name.startswith('_'):
+                rel = os.path.relpath(os.path.join(directory, name), static_folder).replace(os.sep, '/')
+                builder.emit(rel)
+
+    manifest_path = os.path.join(builder.dist, 'manifest.json')
+    data = json.dumps(builder.manifest, indent=2, sort_keys=True).encode('utf-8')
+    os.makedirs(builder.dist, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=builder.dist, prefix='.tmp-')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, manifest_path)
+    return builder.manifest
+
+
+def negotiate(path, accept_encodings):
+    """Pick the best precompressed sibling of ``path`` the client accepts.
+
+    ``accept_encodings`` is werkzeug's ``request.accept_encodings``. Returns
+    ``(path to send, content encoding or None)``.
+    """
+    for encoding, suffix in ENCODINGS:
+        if accept_encodings[encoding] and os.path.exists(path + suffix):
+            return path + suffix, encoding
+    return path, None
@@ -0,0 +1,258 @@
+"""Online backups of the SQLite database and restoring them.
+
+A backup is a copy of the database file made with SQLite's online backup API,
+``pages_per_step`` pages at a time, gzipped. Each step only holds a read lock
+for as long as it takes to copy those pages. In WAL mode the copy also reads
+from one snapshot for the whole run (a read transaction is held on the source),
+so writers are never blocked and their commits do not make the copy start over.
+Without WAL, a write between two steps restarts it.
+
+``restore`` checks a snapshot (it must be an SQLite database of this app, pass
+``quick_check`` and ``foreign_key_check`` and not be from a newer schema),
+brings an older one up to the current schema, and then replaces the data of the
+target database in a single transaction. On SQLite that is one INSERT ... SELECT
+per table from the attached snapshot, with the table's indexes dropped first and
+built again from all the rows afterwards. Since only the snapshot's tables are
+read, ``quick_check`` is enough; ``integrity_check`` would also compare every
+index with its table, which takes ten times as long.
+
+Data derived from the rest (monthly rollups, the search index, data versions)
+is rebuilt rather than copied, and import jobs and scheduler leases, which
+belong to running processes, are cleared. Account balances are restored as they
+were in the snapshot: they include opening balances that no other table records.
+"""
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import zlib
+from contextlib import closing
+
+import sqlalchemy as sa
+from sqlalchemy.schema import CreateIndex, DropIndex
+
+import migrations
+import rollups
+import search
+
+GZIP_MAGIC = b'\x1f\x8b'
+SQLITE_MAGIC = b'SQLite format 3\x00'
+CHUNK_SIZE = 1024 * 1024
+# gzip level: 6 compresses a typical database only a few percent better than 1, at twice the time
+COMPRESSION_LEVEL = 1
+
+# Rebuilt from the other tables after a restore, or not copied at all
+DERIVED_TABLES = {'monthly_rollup', 'data_version'}
+PROCESS_TABLES = {'import_job', 'scheduler_lease'}
+RESTORE_BATCH_SIZE = 5000
+
+
+class SnapshotError(Exception):
+    """The file is not a usable backup of this app's database."""
+
+
+def copy_database(engine, path, pages_per_step=1024, step_pause=0.0, progress=None):
+    """Copy the SQLite database behind ``engine`` to the file ``path`` without stopping writers.
+
+    Sleeps ``step_pause`` seconds between steps. ``progress(remaining, total)``
+    is called after each step. Returns the number of steps taken.
+    """
+    if engine.dialect.name != 'sqlite':
+        raise SnapshotError('Online backups are only supported on SQLite; use pg_dump for PostgreSQL.')
+    steps = 0
+
+    def step(status, remaining, total):
+        nonlocal steps
+        steps += 1
+        if progress:
+            progress(remaining, total)
+        if remaining and step_pause:
+            time.sleep(step_pause)
+
+    source = engine.raw_connection()
+    target = sqlite3.connect(path)
+    try:
+        connection = source.driver_connection
+        if connection.execute('PRAGMA journal_mode').fetchone()[0] == 'wal':
+            connection.execute('BEGIN')
+            connection.execute('SELECT count(*) FROM sqlite_master').fetchone()
+        connection.backup(target, pages=pages_per_step, progress=step)
+    finally:
+        target.close()
+        source.rollback()
+        source.close()
+    return steps
+
+
+def compressed_chunks(path):
+    """Yield the file at ``path`` gzipped, a chunk at a time."""
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    with open(path, 'rb') as f:
+        while data := f.read(CHUNK_SIZE):
+            if chunk := compressor.compress(data):
+                yield chunk
+    yield compressor.flush()
+
+
+def write_backup(engine, path, pages_per_step=1024, step_pause=0.0):
+    """Write a gzipped backup to ``path``, atomically. Returns ``(steps, database size in bytes)``."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, copy = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.db')
+    os.close(fd)
+    try:
+        steps = copy_database(engine, copy, pages_per_step, step_pause)
+        size = os.path.getsize(copy)
+        fd, compressed = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.gz')
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in compressed_chunks(copy):
+                f.write(chunk)
+        os.replace(compressed, path)
+    finally:
+        os.remove(copy)
+    return steps, size
+
+
+def _unpack(path):
+    """Path of a plain SQLite copy of the snapshot at ``path``, gunzipped if need be."""
+    with open(path, 'rb') as f:
+        magic = f.read(len(SQLITE_MAGIC))
+    fd, copy = tempfile.mkstemp(prefix='restore-', suffix='.db')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            if magic.startswith(GZIP_MAGIC):
+                with gzip.open(path, 'rb') as f:
+                    magic = f.read(len(SQLITE_MAGIC))
+                    out.write(magic)
+                    shutil.copyfileobj(f, out, CHUNK_SIZE)
+            else:
+                with open(path, 'rb') as f:
+                    shutil.copyfileobj(f, out, CHUNK_SIZE)
+        if magic != SQLITE_MAGIC:
+            raise SnapshotError('Not an SQLite database.')
+    except (OSError, EOFError, zlib.error) as e:
+        os.remove(copy)
+        raise SnapshotError(f'Cannot read the snapshot: {e}') from e
+    except SnapshotError:
+        os.remove(copy)
+        raise
+    return copy
+
+
+def _validate(path, metadata):
+    """Check the unpacked snapshot and migrate it to the current schema. Returns its original version."""
+    try:
+        with closing(sqlite3.connect(path)) as conn:
+            problems = [row[0] for row in conn.execute('PRAGMA quick_check')]
+            if problems != ['ok']:
+                raise SnapshotError(f"Snapshot is damaged: {'; '.join(problems[:5])}")
+            tables = {name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            if 'schema_version' not in tables or 'user' not in tables:
+                raise SnapshotError('Not a backup of this app.')
+            version = conn.execute('SELECT max(version) FROM schema_version').fetchone()[0] or 0
+    except sqlite3.DatabaseError as e:
+        raise SnapshotError(f'Cannot read the snapshot: {e}') from e
+    if version > migrations.LATEST_VERSION:
+        raise SnapshotError(f'Snapshot is at schema version {version}, newer than this app '
+                            f'({migrations.LATEST_VERSION}); upgrade the app first.')
+
+    engine = sa.create_engine(f'sqlite:///{path}', poolclass=sa.pool.NullPool)
+    try:
+        migrations.upgrade(engine, metadata)
+        with engine.connect() as conn:
+            violations = conn.exec_driver_sql('PRAGMA foreign_key_check').all()
+    finally:
+        engine.dispose()
+    if violations:
+        tables = sorted({row[0] for row in violations})
+        raise SnapshotError(f"Snapshot has {len(violations)} rows pointing at missing rows (in {', '.join(tables)}).")
+    return version
+
+
+def _copied_tables(metadata):
+    return [table for table in metadata.sorted_tables if table.name not in DERIVED_TABLES | PROCESS_TABLES]
+
+
+def _load_sqlite(conn, metadata):
+    """Replace the tables with the attached snapshot's, with one INSERT ... SELECT each."""
+    quote = conn.dialect.identifier_preparer.quote
+    for table in _copied_tables(metadata):
+        columns = ', '.join(quote(column.name) for column in table.columns)
+        # Building an index from all the rows at once is several times faster than growing it row by row
+        for index in table.indexes:
+            conn.execute(DropIndex(index, if_exists=True))
+        conn.exec_driver_sql(f'INSERT INTO main.{quote(table.name)} ({columns}) '
+                             f'SELECT {columns} FROM snapshot.{quote(table.name)}')
+        for index in table.indexes:
+            conn.execute(CreateIndex(index))
+
+
+def _load_batches(conn, metadata, path):
+    """Replace the tables with the snapshot's through executemany INSERTs, for other databases."""
+    snapshot = sa.create_engine(f'sqlite:///{path}', poolclass=sa.pool.NullPool)
+    try:
+        with snapshot.connect() as source:
+            for table in _copied_tables(metadata):
+                result = source.execution_options(yield_per=RESTORE_BATCH_SIZE).execute(sa.select(table))
+                for rows in result.mappings().partitions():
+                    conn.execute(table.insert(), [dict(row) for row in rows])
+                if conn.dialect.name == 'postgresql' and 'id' in table.c and table.c.id.autoincrement:
+                    # Explicit ids do not move the sequence on
+                    conn.execute(sa.select(sa.func.setval(
+                        sa.func.pg_get_serial_sequence(conn.dialect.identifier_preparer.quote(table.name), 'id'),
+                        sa.select(sa.func.coalesce(sa.func.max(table.c.id), 0) + 1).scalar_subquery(),
+                        False)))
+    finally:
+        snapshot.dispose()
+
+
+def restore(engine, metadata, path):
+    """Replace all data of the database behind ``engine`` with the snapshot at ``path``.
+
+    Returns ``{'schema_version': version of the snapshot, 'rows': {table: count}}``.
+    Raises SnapshotError, before touching the database, if the snapshot is unusable.
+    """
+    copy = _unpack(path)
+    try:
+        version = _validate(copy, metadata)
+        data_version = metadata.tables['data_version']
+        user = metadata.tables['user']
+        with engine.connect() as conn:
+            sqlite = conn.dialect.name == 'sqlite'
+            if sqlite:
+                # Must happen outside a transaction; the load below is then a single one
+                conn.exec_driver_sql('ATTACH DATABASE ? AS snapshot', (copy,))
+                conn.exec_driver_sql('BEGIN IMMEDIATE')
+            try:
+                versions = dict(conn.execute(sa.select(data_version.c.user_id, data_version.c.version)).all())
+                if sqlite and search.has_table(conn):
+                    # Cheaper to index the restored rows in one go than row by row
+                    search.drop_triggers(conn)
+                for table in reversed(metadata.sorted_tables):
+                    conn.execute(table.delete())
+                if sqlite:
+                    _load_sqlite(conn, metadata)
+                else:
+                    _load_batches(conn, metadata, copy)
+
+                rollups.rebuild(conn, metadata)
+                if search.has_index(conn):
+                    search.create_index(conn)
+                # Versions only move forward, so no browser keeps a cached response of the old data
+                user_ids = conn.execute(sa.select(user.c.id)).scalars().all()
+                if user_ids:
+                    conn.execute(data_version.insert(), [{'user_id': user_id, 'version': versions.get(user_id, 0) + 1}
+                                                         for user_id in user_ids])
+                rows = {table.name: conn.execute(sa.select(sa.func.count()).select_from(table)).scalar()
+                        for table in _copied_tables(metadata)}
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                if sqlite:
+                    conn.exec_driver_sql('DETACH DATABASE snapshot')
+    finally:
+        os.remove(copy)
+    return {'schema_version': version, 'rows': rows}
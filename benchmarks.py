@@ -0,0 +1,629 @@
+"""Synthetic workloads and timing helpers behind the ``flask bench-*`` commands."""
+import multiprocessing
+import os
+import csv
+import io
+import itertools
+import json
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
+from datetime import date, datetime, timedelta
+
+import sqlalchemy as sa
+
+import backups
+import categorization
+import classifier
+import migrations
+import recurrence
+import rollups
+import search
+import statements
+
+
+# Only imports, exports, the AI, analytics and the CLI use these; starting the app must not load them
+LAZY_MODULES = ('google.generativeai', 'openpyxl', 'bs4', 'numpy', 'commands', 'benchmarks')
+
+STARTUP_PROBE = """
+import importlib, json, sys, time
+started = time.perf_counter()
+module = importlib.import_module(sys.argv[1])
+imported = time.perf_counter()
+app = module.create_app()
+created = time.perf_counter()
+status = app.test_client().get(sys.argv[2]).status_code
+answered = time.perf_counter()
+print(json.dumps({'import': imported - started, 'create_app': created - imported, 'first_request': answered - created,
+                  'status': status, 'lazy_loaded': [name for name in sys.argv[3:] if name in sys.modules]}))
+"""
+
+
+def best_of(repeat, fn, *args):
+    """Run ``fn`` ``repeat`` times and return (fastest seconds, last result)."""
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def write_html_statement(path, rows, seed=0):
+    """Write a bank-export-like HTML statement: layout tables, noise and one transaction table."""
+    rnd = random.Random(seed)
+    merchants = ['MİGROS TİC. A.Ş.', 'Shell &amp; Co', 'BİM <b>MAĞAZA</b>', 'Netflix.com', 'IBAN TRANSFER', 'A101 &#304;STANBUL']
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<!DOCTYPE html><html><head><meta charset="utf-8"><title>Hesap Özeti</title>'
+                '<style>td { padding: 2px; }</style><script>var tpl = "<table><tr><td>x</td></tr></table>";</script>'
+                '</head><body>\n<table class="layout" width="100%"><tr><td>\n')
+        for block in range(20):
+            f.write(f'<table class="banner"><tr><td><img src="logo{block}.png"></td><td>Müşteri Hizmetleri {block}</td></tr>'
+                    f'<tr><td colspan="2"><table><tr><td>Şube</td><td>{block:04d}</td></tr></table></td></tr></table>\n')
+        f.write('</td></tr><tr><td>\n<table class="statement"><thead><tr><th>İşlem Tarihi</th><th> Açıklama </th>'
+                '<th>Tutar</th><th>Bakiye</th></tr></thead><tbody>\n')
+        day = date(2015, 1, 1)
+        balance = 0.0
+        for i in range(rows):
+            day += timedelta(days=rnd.random() < 0.3)
+            amount = round(rnd.uniform(-2500, 1500), 2)
+            balance += amount
+            amount_str = f'{amount:,.2f}'.replace(',', 'X').replace('.', ',').replace('X', '.')
+            balance_str = f'{balance:,.2f}'.replace(',', 'X').replace('.', ',').replace('X', '.')
+            f.write(f'<tr class="r{i % 2}"><td> {day:%d.%m.%Y} </td><td><span>{rnd.choice(merchants)}</span> REF{i}</td>'
+                    f'<td align="right">{amount_str} TL</td><td>{balance_str}</td></tr>\n')
+            if i % 500 == 499:
+                f.write('<tr><td colspan="4"><!-- page break --><b>Ara Toplam</b></td></tr>\n')
+        f.write('</tbody></table>\n</td></tr></table>\n<p>Bu belge bilgi amaçlıdır.</p></body></html>\n')
+
+
+def bench_html_parser(rows, repeat=3):
+    """Compare the streaming parser with the BeautifulSoup reference on a synthetic statement."""
+    fd, path = tempfile.mkstemp(suffix='.html')
+    os.close(fd)
+    try:
+        write_html_statement(path, rows)
+        soup_time, expected = best_of(repeat, lambda: list(statements.parse_html_statement_soup(path)))
+        fast_time, actual = best_of(repeat, lambda: list(statements.parse_html_statement(path)))
+        return {
+            'rows': len(expected),
+            'size_mb': os.path.getsize(path) / (1024 * 1024),
+            'soup_seconds': soup_time,
+            'fast_seconds': fast_time,
+            'identical': expected == actual,
+        }
+    finally:
+        os.remove(path)
+
+
+class StubCategorizer:
+    """Local stand-in for the Gemini client: answers after ``latency`` seconds."""
+    CATEGORIES = ['Groceries', 'Transport', 'Utilities', 'Dining', 'Shopping', 'Transfer']
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self.descriptions = 0
+        self._lock = threading.Lock()
+
+    def categorize(self, descriptions, categories, timeout):
+        with self._lock:
+            self.calls += 1
+            self.descriptions += len(descriptions)
+        time.sleep(self.latency)
+        return {d: self.CATEGORIES[zlib.crc32(d.encode('utf-8')) % len(self.CATEGORIES)] for d in descriptions}
+
+
+def bench_ai_categorization(descriptions, latency=0.5, chunk_size=50, max_workers=4):
+    """Time one-chunk-at-a-time against concurrent chunked categorization with a stub client."""
+    names = [f'MERCHANT {i:05d}' for i in range(descriptions)]
+    sequential_time, sequential = best_of(1, categorization.categorize_in_chunks,
+                                          StubCategorizer(latency), names, [], chunk_size, 1)
+    client = StubCategorizer(latency)
+    concurrent_time, concurrent = best_of(1, categorization.categorize_in_chunks,
+                                          client, names, [], chunk_size, max_workers)
+    return {
+        'descriptions': descriptions,
+        'requests': client.calls,
+        'sequential_seconds': sequential_time,
+        'concurrent_seconds': concurrent_time,
+        'categorized': len(concurrent),
+        'identical': sequential == concurrent,
+    }
+
+
+def bench_local_categorizer(training_rows=20000, rows=20000, seed=0):
+    """Train the naive Bayes categorizer on synthetic history and time it on a fresh statement."""
+    rnd = random.Random(seed)
+    merchants = {
+        1: ['MİGROS', 'A101', 'BİM', 'ŞOK MARKET', 'CARREFOURSA'],
+        2: ['SHELL', 'OPET', 'BP', 'İSTANBULKART', 'UBER'],
+        3: ['TURKCELL', 'İGDAŞ', 'ENERJİSA', 'SUPERONLINE'],
+        4: ['NETFLIX.COM', 'SPOTIFY', 'STEAM'],
+        5: ['MAAŞ ÖDEMESİ', 'EFT GELEN'],
+    }
+    names = [(category, name) for category, names in merchants.items() for name in names]
+
+    def description(name):
+        return f'{name} {rnd.choice(["İSTANBUL", "ANKARA", "IZMIR", ""])} REF{rnd.randrange(10 ** 6)}'
+
+    model = classifier.NaiveBayesCategorizer()
+    started = time.perf_counter()
+    for _ in range(training_rows):
+        category, name = rnd.choice(names)
+        model.learn(description(name), category)
+    model.compile()
+    train_seconds = time.perf_counter() - started
+
+    statement = [rnd.choice(names) for _ in range(rows)]
+    statement = [(category, description(name)) for category, name in statement]
+    started = time.perf_counter()
+    predictions = [model.predict(text) for _, text in statement]
+    predict_seconds = time.perf_counter() - started
+    correct = sum(predicted == category for (category, _), (predicted, _) in zip(statement, predictions))
+    return {
+        'training_rows': training_rows,
+        'rows': rows,
+        'train_seconds': train_seconds,
+        'predict_seconds': predict_seconds,
+        'accuracy': correct / rows,
+        'mean_confidence': sum(confidence for _, confidence in predictions) / rows,
+    }
+
+
+def bench_requests(client, url, count):
+    """Issue ``count`` GETs with a Flask test client; report time and SQL statements per request."""
+    client.get(url)  # Warm up
+    queries = 0
+    started = time.perf_counter()
+    for _ in range(count):
+        response = client.get(url)
+        queries += int(response.headers.get('X-Query-Count', 0))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': count,
+        'ms_per_request': elapsed * 1000 / count,
+        'queries_per_request': queries / count,
+    }
+
+
+def bench_transaction_batch(client, account_id, category_ids, rows, batch_size):
+    """Create ``rows`` transactions, recategorize them one PUT at a time and then in batches, and delete them.
+
+    Returns the seconds, requests and SQL statements (from the X-Query-Count
+    header) of each phase.
+    """
+    rnd = random.Random(0)
+    phases = {}
+
+    def timed(phase, requests):
+        started = time.perf_counter()
+        queries, responses = 0, []
+        for method, url, body in requests:
+            response = client.open(url, method=method, json=body)
+            if response.status_code >= 400:
+                raise RuntimeError(f'{method} {url} answered {response.status_code}: {response.get_data(as_text=True)}')
+            queries += int(response.headers.get('X-Query-Count', 0))
+            responses.append(response.get_json())
+        phases[phase] = {'seconds': time.perf_counter() - started, 'requests': len(requests), 'queries': queries}
+        return responses
+
+    def batches(operations):
+        return [('POST', '/api/transactions/batch', {'operations': operations[i:i + batch_size]})
+                for i in range(0, len(operations), batch_size)]
+
+    created = timed('create (batch)', batches([
+        {'op': 'create', 'account_id': account_id, 'description': f'Batch row {i}',
+         'amount': rnd.randint(-40000, 40000) / 4, 'category_id': rnd.choice(category_ids)} for i in range(rows)]))
+    transactions = [result for response in created for result in response['results']]
+    timed('recategorize (one PUT each)', [
+        ('PUT', f"/api/transactions/{t['id']}", {'description': t['description'], 'amount': t['amount'],
+                                                 'category_id': category_ids[0]}) for t in transactions])
+    timed('recategorize (batch)', batches([
+        {'op': 'recategorize', 'id': t['id'], 'category_id': category_ids[1]} for t in transactions]))
+    timed('delete (batch)', batches([{'op': 'delete', 'id': t['id']} for t in transactions[:rows // 2]]))
+    return phases
+
+
+def read_export(file_format, source):
+    """The rows of an /api/export file (bytes or a path), header first; empty cells are None."""
+    if file_format == 'csv':
+        data = source if isinstance(source, bytes) else open(source, 'rb').read()
+        return [[float(value) if i == 4 and n else value or None for i, value in enumerate(row)]
+                for n, row in enumerate(csv.reader(io.StringIO(data.decode('utf-8-sig'))))]
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(io.BytesIO(source) if isinstance(source, bytes) else source, read_only=True)
+    try:
+        return [[value.strftime('%Y-%m-%d') if hasattr(value, 'strftime') else value for value in row]
+                for row in workbook.active.iter_rows(values_only=True)]
+    finally:
+        workbook.close()
+
+
+def stream_download(client, url, path):
+    """GET ``url`` without buffering the response, writing the body to ``path``.
+
+    Reports the time to the first chunk and to the end, the size, and the peak
+    memory Python allocated meanwhile (traced, so everything runs slower).
+    """
+    tracemalloc.start()
+    started = time.perf_counter()
+    response = client.get(url, buffered=False)
+    first_chunk, size = None, 0
+    with open(path, 'wb') as f:
+        for chunk in response.response:
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - started
+            f.write(chunk)
+            size += len(chunk)
+    response.close()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'status': response.status_code, 'first_chunk_ms': (first_chunk or elapsed) * 1000, 'seconds': elapsed,
+            'size_mb': size / 2 ** 20, 'peak_mb': peak / 2 ** 20}
+
+
+def buffered_xlsx(rows, path):
+    """The export as it would be without streaming: every row in memory, then a BytesIO workbook."""
+    import openpyxl
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    rows = list(rows)
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    for row in rows:
+        sheet.append(tuple(row))
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    with open(path, 'wb') as f:
+        f.write(buffer.getvalue())
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': elapsed, 'size_mb': len(buffer.getvalue()) / 2 ** 20, 'peak_mb': peak / 2 ** 20}
+
+
+def run_forked(jobs, after_fork=None):
+    """Run each ``(fn, args)`` in its own forked process at once; return their results in order.
+
+    ``after_fork`` runs first in every child (e.g. to drop inherited database
+    connections). ``fn`` then runs on a fresh thread, so test-client requests get
+    their own app context, as under gunicorn. A job that raised returns
+    ``{'error': message}``.
+    """
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+
+    def child(index, fn, args):
+        if after_fork:
+            after_fork()
+        outcome = []
+
+        def work():
+            try:
+                outcome.append(fn(*args))
+            except Exception as e:
+                outcome.append({'error': f'{type(e).__name__}: {e}'})
+
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+        results.put((index, outcome[0]))
+
+    processes = [context.Process(target=child, args=(i, fn, args)) for i, (fn, args) in enumerate(jobs)]
+    for process in processes:
+        process.start()
+    collected = dict(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return [collected[i] for i in range(len(jobs))]
+
+
+def random_writes(client, account_id, operations, seed=0):
+    """Add, edit and delete transactions of one account through the API.
+
+    Amounts are multiples of 0.25, which floats add exactly, so the balance
+    must match the sum of the transactions to the last bit.
+    """
+    rnd = random.Random(seed)
+    created = []
+    failed = 0
+    started = time.perf_counter()
+    for i in range(operations):
+        amount = rnd.randint(-40000, 40000) / 4
+        roll = rnd.random()
+        if created and roll < 0.15:
+            response = client.delete(f'/api/transactions/{created.pop(rnd.randrange(len(created)))}')
+        elif created and roll < 0.3:
+            response = client.put(f'/api/transactions/{rnd.choice(created)}',
+                                  json={'description': f'Edited {seed}-{i}', 'amount': amount})
+        else:
+            response = client.post('/api/transactions',
+                                   json={'account_id': account_id, 'description': f'Stress {seed}-{i}', 'amount': amount})
+            if response.status_code == 201:
+                created.append(response.get_json()['id'])
+        failed += response.status_code >= 400
+    return {'operations': operations, 'failed': failed, 'seconds': time.perf_counter() - started}
+
+
+def sample_latency(client, url, count=None, until=None):
+    """GET ``url`` ``count`` times, or until ``until()`` is true; return latency percentiles in ms."""
+    timings = []
+    while (count is None or len(timings) < count) and not (until and until()):
+        started = time.perf_counter()
+        client.get(url)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    if not timings:
+        return {'requests': 0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+    return {
+        'requests': len(timings),
+        'p50_ms': timings[len(timings) // 2],
+        'p95_ms': timings[int(len(timings) * 0.95)],
+        'max_ms': timings[-1],
+    }
+
+
+def bench_startup(module, directory, url='/login', runs=5):
+    """Start the app in ``runs`` fresh interpreters and return the median time of each phase.
+
+    Phases are importing ``module``, ``create_app()``, the first request to
+    ``url`` and the whole process (``python -c pass`` is timed alongside for
+    comparison). ``lazy_loaded`` lists the LAZY_MODULES that got imported anyway.
+    """
+    env = dict(os.environ, RECURRING_SCHEDULER='off')
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'], check=True)
+        interpreter = time.perf_counter() - started
+        started = time.perf_counter()
+        process = subprocess.run([sys.executable, '-c', STARTUP_PROBE, module, url, *LAZY_MODULES],
+                                 cwd=directory, env=env, capture_output=True, text=True)
+        if process.returncode:
+            raise RuntimeError(f'App failed to start: {process.stderr.strip()}')
+        sample = json.loads(process.stdout.splitlines()[-1])
+        sample.update(process=time.perf_counter() - started, interpreter=interpreter)
+        samples.append(sample)
+    result = {phase: statistics.median(sample[phase] for sample in samples)
+              for phase in ('import', 'create_app', 'first_request', 'process', 'interpreter')}
+    result['status'] = samples[-1]['status']
+    result['lazy_loaded'] = sorted({name for sample in samples for name in sample['lazy_loaded']})
+    return result
+
+
+# Transactions for bench-backup and bench-analytics, generated by SQLite itself: a Python loop would take longer than what is timed.
+# Dates are stored as SQLAlchemy writes them, so they compare correctly with its bound parameters.
+FILL_TRANSACTIONS = """
+WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i + 1 < :rows)
+INSERT INTO "transaction" (description, amount, date, account_id, category_id, fingerprint)
+SELECT CASE i % 5 WHEN 0 THEN 'Coffee shop ' WHEN 1 THEN 'Supermarket ' WHEN 2 THEN 'Salary '
+                  WHEN 3 THEN 'Rent ' ELSE 'Fuel station ' END || (i % 1000),
+       round(((i * 7919) % 200000 - 100000) / 100.0, 2),
+       datetime('2016-01-01', '+' || (i % 3650) || ' days', '+' || (i % 86400) || ' seconds') || '.000000',
+       :first_account + i % :accounts,
+       CASE WHEN i % 7 = 0 THEN NULL ELSE :first_category + i % :categories END,
+       lower(hex(randomblob(20)))
+FROM n
+"""
+
+
+def scratch_database(path, metadata):
+    """A migrated SQLite database in WAL mode at ``path``; returns its engine."""
+    engine = sa.create_engine(f'sqlite:///{path}', poolclass=sa.pool.NullPool)
+    with engine.connect() as conn:
+        conn.exec_driver_sql('PRAGMA journal_mode = WAL')
+    migrations.upgrade(engine, metadata)
+    return engine
+
+
+def fill_database(engine, metadata, rows, accounts=5, categories=6):
+    """Give a scratch database one user with ``rows`` transactions, their rollups and search index."""
+    with engine.begin() as conn:
+        user_id = conn.execute(metadata.tables['user'].insert().values(
+            username=f'bench-{rows}', password_hash='-', currency='$')).inserted_primary_key[0]
+        account_ids = [conn.execute(metadata.tables['account'].insert().values(
+            name=f'Account {i}', type='checking', balance=0.0, user_id=user_id)).inserted_primary_key[0]
+            for i in range(accounts)]
+        category_ids = [conn.execute(metadata.tables['category'].insert().values(
+            name=f'Category {i}', type='expense', user_id=user_id)).inserted_primary_key[0]
+            for i in range(categories)]
+        conn.execute(sa.text(FILL_TRANSACTIONS), {'rows': rows, 'first_account': account_ids[0], 'accounts': accounts,
+                                                  'first_category': category_ids[0], 'categories': categories})
+        conn.exec_driver_sql('UPDATE account SET balance = 1000 + '
+                             '(SELECT total(amount) FROM "transaction" WHERE account_id = account.id)')
+        rollups.rebuild(conn, metadata)
+        search.create_index(conn)
+    return user_id
+
+
+def database_summary(engine):
+    """Counts and totals that a restore must reproduce exactly."""
+    with engine.connect() as conn:
+        query = lambda sql: tuple(conn.exec_driver_sql(sql).one())
+        return {
+            'users': query('SELECT count(*), total(id) FROM user'),
+            'transactions': query('SELECT count(*), total(amount), max(id), count(category_id) FROM "transaction"'),
+            'balances': query('SELECT count(*), total(balance) FROM account'),
+            'rollups': query('SELECT count(*), total(income), total(expense), total(count) FROM monthly_rollup'),
+            'search': query("SELECT count(*) FROM transaction_search WHERE transaction_search MATCH 'coffee*'"),
+        }
+
+
+def timed_writes(path, started, stop):
+    """Insert a transaction every millisecond into the database at ``path`` once ``started`` is set.
+
+    Runs until ``stop`` is set; returns the number of writes and their latencies in ms.
+    """
+    conn = sqlite3.connect(path, isolation_level=None, timeout=30)
+    timings = []
+    started.wait()
+    while not stop.is_set():
+        began = time.perf_counter()
+        conn.execute('INSERT INTO "transaction" (description, amount, date, account_id) '
+                     "VALUES ('Written during the backup', -1.0, datetime('now'), (SELECT min(id) FROM account))")
+        timings.append((time.perf_counter() - began) * 1000)
+        time.sleep(0.001)
+    conn.close()
+    timings.sort()
+    return {'writes': len(timings), 'p50_ms': timings[len(timings) // 2] if timings else 0.0,
+            'max_ms': timings[-1] if timings else 0.0}
+
+
+def bench_backup(metadata, rows, directory, pages_per_step=1024, step_pause=0.0):
+    """Back up a scratch database of ``rows`` transactions while it is written to, then restore it.
+
+    Everything happens in ``directory``. The restore goes into a second scratch
+    database that already has data of its own; both summaries must match.
+    """
+    timings = {}
+    source_path = os.path.join(directory, 'source.db')
+    source = scratch_database(source_path, metadata)
+    started = time.perf_counter()
+    fill_database(source, metadata, rows)
+    timings['fill'] = time.perf_counter() - started
+    expected = database_summary(source)
+
+    # Rows written once the backup has begun must not end up in it
+    writing, stop, writes = threading.Event(), threading.Event(), {}
+    writer = threading.Thread(target=lambda: writes.update(timed_writes(source_path, writing, stop)))
+    writer.start()
+    copy = os.path.join(directory, 'backup.db')
+    remaining = []
+    started = time.perf_counter()
+    try:
+        steps = backups.copy_database(source, copy, pages_per_step, step_pause,
+                                      progress=lambda left, total: (remaining.append(left), writing.set()))
+    finally:
+        writing.set()
+        stop.set()
+        writer.join()
+    timings['backup'] = time.perf_counter() - started
+    restarts = sum(later > earlier for earlier, later in zip(remaining, remaining[1:]))
+
+    started = time.perf_counter()
+    snapshot = copy + '.gz'
+    with open(snapshot, 'wb') as f:
+        for chunk in backups.compressed_chunks(copy):
+            f.write(chunk)
+    timings['compress'] = time.perf_counter() - started
+
+    target = scratch_database(os.path.join(directory, 'target.db'), metadata)
+    fill_database(target, metadata, 1000)
+    started = time.perf_counter()
+    restored = backups.restore(target, metadata, snapshot)
+    timings['restore'] = time.perf_counter() - started
+    actual = database_summary(target)
+    with target.connect() as conn:
+        integrity = conn.exec_driver_sql('PRAGMA integrity_check').scalar()
+    source.dispose()
+    target.dispose()
+    return {
+        'seconds': timings, 'steps': steps, 'restarts': restarts, 'writes': writes,
+        'database_mb': os.path.getsize(copy) / 2 ** 20, 'snapshot_mb': os.path.getsize(snapshot) / 2 ** 20,
+        'rows': restored['rows'], 'expected': expected, 'actual': actual, 'integrity': integrity,
+    }
+
+
+def analytics_agree(body, periods, groups, tolerance=1e-9):
+    """Whether an /api/analytics response says what ``(periods, groups)`` (from analytics_by_sql) does.
+
+    Totals may differ by ``tolerance`` relative to their size: the two add the same amounts in different orders.
+    """
+    return (body['periods'] == [period.isoformat() for period in periods]
+            and [series['key'] for series in body['series']] == [key for key, totals, counts in groups]
+            and all(series['counts'] == counts
+                    and all(abs(a - b) <= tolerance * max(1.0, abs(b)) for a, b in zip(series['totals'], totals))
+                    for series, (key, totals, counts) in zip(body['series'], groups)))
+
+
+def bench_analytics(client, reference, queries, repeat=5):
+    """Answer ``queries`` (query strings for /api/analytics) through the API and through ``reference``.
+
+    The first request builds the user's snapshot and is timed on its own.
+    ``reference(body)`` answers the range of a response with SQL, as
+    ``(periods, groups)``. Returns the fastest of ``repeat`` requests, the SQL
+    time and whether the two agree, per query.
+    """
+    started = time.perf_counter()
+    response = client.get('/api/analytics', query_string=queries[0])
+    first_request = time.perf_counter() - started
+    if response.status_code != 200:
+        raise RuntimeError(f'/api/analytics answered {response.status_code}: {response.get_data(as_text=True)}')
+    results = []
+    for params in queries:
+        seconds, response = best_of(repeat, lambda: client.get('/api/analytics', query_string=params))
+        body = response.get_json()
+        if response.status_code != 200:
+            raise RuntimeError(f'/api/analytics answered {response.status_code}: {body}')
+        started = time.perf_counter()
+        periods, groups = reference(body)
+        results.append({
+            'params': params, 'periods': len(body['periods']), 'series': len(body['series']),
+            'api_ms': seconds * 1000, 'sql_ms': (time.perf_counter() - started) * 1000,
+            'agree': analytics_agree(body, periods, groups),
+        })
+    return {'first_request_ms': first_request * 1000, 'queries': results}
+
+
+def forecast_by_occurrences(rules, balances, first_day, last_day):
+    """What forecast.project answers, one occurrence at a time as process_recurring_transactions posts them.
+
+    Returns ``{account id: [balance per day]}``.
+    """
+    length = (last_day - first_day).days + 1
+    changes = {account_id: [0.0] * length for account_id in balances}
+    for rule in rules:
+        if rule.account_id not in changes or not rule.is_active or rule.frequency not in recurrence.FREQUENCIES:
+            continue
+        stop_day = min(last_day, rule.end_date.date()) if rule.end_date else last_day
+        due_dates = recurrence.occurrences(rule.start_date, rule.frequency, rule.next_due_date.date(), stop_day)
+        if rule.payment_type == 'debt' and rule.total_amount:
+            amounts = [-payment for payment in recurrence.debt_payments(rule.amount, rule.total_amount,
+                                                                        rule.paid_amount, len(due_dates))]
+        else:
+            amounts = [rule.amount] * len(due_dates)
+        for due_date, amount in zip(due_dates, amounts):
+            changes[rule.account_id][max(0, (due_date.date() - first_day).days)] += amount
+    return {account_id: list(itertools.accumulate(changes[account_id], initial=balance))[1:]
+            for account_id, balance in balances.items()}
+
+
+def add_recurring_rules(engine, metadata, user_id, count, today, seed=0):
+    """Give the user ``count`` active recurring rules spread over their accounts, due from ``today`` on.
+
+    Mostly monthly and weekly, some daily and yearly; a fifth end within ten
+    years and a fifth are debts (some already part paid).
+    """
+    rnd = random.Random(seed)
+    rules = []
+    with engine.begin() as conn:
+        account_ids = conn.execute(sa.select(metadata.tables['account'].c.id)
+                                   .where(metadata.tables['account'].c.user_id == user_id)).scalars().all()
+        for i in range(count):
+            frequency = rnd.choices(recurrence.FREQUENCIES, weights=(1, 3, 5, 1))[0]
+            start = datetime(today.year - rnd.randint(0, 5), rnd.randint(1, 12), 1) + timedelta(days=rnd.randint(0, 30))
+            debt = rnd.random() < 0.2
+            total = round(rnd.uniform(1000, 50000), 2) if debt else None
+            rules.append({
+                'name': f'Rule {i}', 'amount': round(rnd.uniform(-1500, 800), 2), 'frequency': frequency,
+                'start_date': start, 'next_due_date': recurrence.next_on_or_after(start, frequency, today),
+                'end_date': datetime.combine(today, datetime.min.time()) + timedelta(days=rnd.randint(0, 3650))
+                if rnd.random() < 0.2 else None,
+                'account_id': rnd.choice(account_ids), 'user_id': user_id, 'is_active': True,
+                'payment_type': 'debt' if debt else 'standard', 'total_amount': total,
+                'paid_amount': round(rnd.uniform(0, total / 2), 2) if debt else 0.0,
+            })
+        if rules:
+            conn.execute(metadata.tables['recurring_transaction'].insert(), rules)
@@ -0,0 +1,90 @@
+"""AI categorization of statement descriptions.
+
+``categorize_in_chunks`` sends the unique descriptions of an import to a
+categorizer client in fixed-size chunks, several at a time, under an overall
+deadline. A client is anything with a ``categorize(descriptions, categories,
+timeout)`` method returning ``{description: category name}``; the app gets one
+from ``app.config['AI_CLIENT_FACTORY']`` so a local stub can replace Gemini.
+Answers are cached per user by the caller (see ``CategoryCache`` in app.py).
+"""
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+def parse_json_response(text):
+    """Parse a JSON object from a model answer, tolerating a Markdown code fence."""
+    text = text.strip()
+    if text.startswith('```json'):
+        text = text[7:-3]
+    elif text.startswith('```'):  # Handle plain code block
+        text = text[3:-3]
+    return json.loads(text)
+
+
+class GeminiCategorizer:
+    def __init__(self, api_key, model_name='gemini-2.5-flash'):
+        # Imported on first use: it takes longer than the rest of the app to load
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+
+    def categorize(self, descriptions, categories, timeout):
+        prompt = f"""
+        You are a financial assistant. Map these transaction descriptions to the most appropriate category from this list: {categories}.
+        If none fit well, create a new simple category name (e.g. 'Groceries', 'Transport', 'Utilities', 'Salary', 'Transfer').
+        Respond ONLY with a valid JSON object where keys are descriptions and values are category names.
+        Descriptions: {json.dumps(descriptions)}
+        """
+        response = self.model.generate_content(prompt, request_options={'timeout': timeout})
+        return parse_json_response(response.text)
+
+
+def gemini_client(user):
+    """Default ``AI_CLIENT_FACTORY``: a Gemini client for the user's API key, or None."""
+    if not user.gemini_api_key:
+        return None
+    try:
+        return GeminiCategorizer(user.gemini_api_key)
+    except ImportError:
+        logging.warning("AI categorization requested but google.generativeai module is missing.")
+        return None
+
+
+def categorize_in_chunks(client, descriptions, categories, chunk_size=50, max_workers=4, timeout=60):
+    """Categorize ``descriptions`` with up to ``max_workers`` concurrent chunk requests.
+
+    Chunks that fail, or are still running when ``timeout`` seconds have passed,
+    are logged and left out of the result. Only answers for descriptions that
+    were asked about and that name a category are returned.
+    """
+    descriptions = list(dict.fromkeys(descriptions))
+    chunks = [descriptions[i:i + chunk_size] for i in range(0, len(descriptions), chunk_size)]
+    if not chunks:
+        return {}
+
+    deadline = time.monotonic() + timeout
+    category_map = {}
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(chunks)), thread_name_prefix='categorize')
+    try:
+        futures = {executor.submit(client.categorize, chunk, categories, timeout): chunk for chunk in chunks}
+        done, not_done = wait(futures, timeout=max(deadline - time.monotonic(), 0))
+        for future in done:
+            try:
+                answer = future.result()
+            except Exception as ai_error:
+                logging.error(f"AI Categorization failed for {len(futures[future])} descriptions: {ai_error}")
+                continue
+            asked = set(futures[future])
+            category_map.update({
+                description: name.strip()[:50] for description, name in answer.items()
+                if description in asked and isinstance(name, str) and name.strip()
+            })
+        if not_done:
+            logging.error(f"AI Categorization timed out after {timeout}s; "
+                          f"{sum(len(futures[f]) for f in not_done)} descriptions left uncategorized")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return category_map
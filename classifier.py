@@ -0,0 +1,113 @@
+"""Offline transaction categorizer learned from a user's own categorized history.
+
+A multinomial naive Bayes model over the words of a description. It is
+trained incrementally (``learn`` one description at a time), serializes to a
+JSON snapshot, and ``predict`` returns the best category with its posterior
+probability as a confidence score. Imports use it as a first pass and only
+hand low-confidence rows to the AI.
+"""
+import json
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+from statements import normalize_description
+
+WORD = re.compile(r'[^\W\d_]{2,}')
+COMBINING_MARKS = re.compile(r'[\u0300-\u036f]')
+MEMO_SIZE = 100000
+
+
+def tokenize(description):
+    """Accent-insensitive words of a description; numbers (references, dates) are dropped."""
+    text = normalize_description(description)
+    if not text.isascii():
+        text = COMBINING_MARKS.sub('', unicodedata.normalize('NFKD', text))
+    return WORD.findall(text)
+
+
+class NaiveBayesCategorizer:
+    def __init__(self, alpha=1.0):
+        self.alpha = alpha
+        self.doc_counts = Counter()                # category -> descriptions learned
+        self.token_counts = defaultdict(Counter)   # category -> token -> occurrences
+        self.token_totals = Counter()              # category -> tokens learned
+        self.vocabulary = Counter()                # token -> occurrences over all categories
+        self._scores = None
+
+    def learn(self, description, category, weight=1):
+        """Add a labelled description to the model (``weight=-1`` takes one back out)."""
+        tokens = tokenize(description)
+        self.doc_counts[category] += weight
+        for token in tokens:
+            self.token_counts[category][token] += weight
+            self.vocabulary[token] += weight
+        self.token_totals[category] += weight * len(tokens)
+        self._scores = None
+
+    def compile(self):
+        """Precompute the scoring tables ``predict`` uses (done lazily after ``learn``)."""
+        # Score of category c for L known tokens:
+        #   log P(c) + L * (log alpha - log(N_c + alpha * |V|)) + sum of per-token bonuses,
+        # where a token's bonus for c is log(n(t, c) + alpha) - log alpha, and only
+        # nonzero for categories that have seen the token.
+        self.doc_counts = +self.doc_counts
+        self.vocabulary = +self.vocabulary
+        total_docs = sum(self.doc_counts.values())
+        vocabulary_size = max(len(self.vocabulary), 1)
+        log_alpha = math.log(self.alpha)
+        base = {}
+        for category, docs in self.doc_counts.items():
+            base[category] = (math.log(docs / total_docs),
+                              log_alpha - math.log(self.token_totals[category] + self.alpha * vocabulary_size))
+        bonuses = defaultdict(list)
+        for category in base:
+            for token, count in self.token_counts[category].items():
+                if count > 0:
+                    bonuses[token].append((category, math.log(count + self.alpha) - log_alpha))
+        self._scores = (base, bonuses, {})
+
+    def predict(self, description):
+        """Return ``(category, confidence)``, or ``(None, 0.0)`` when no word is known."""
+        if self._scores is None:
+            self.compile()
+        base, bonuses, memo = self._scores
+        tokens = tuple(token for token in tokenize(description) if token in bonuses)
+        if tokens in memo:
+            return memo[tokens]
+        if not tokens or not base:
+            return None, 0.0
+
+        scores = {category: prior + len(tokens) * per_token for category, (prior, per_token) in base.items()}
+        for token in tokens:
+            for category, bonus in bonuses.get(token, ()):
+                scores[category] += bonus
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        total = sum(math.exp(score - top) for score in scores.values())
+        # Descriptions differing only in numbers or unknown words share a prediction
+        if len(memo) >= MEMO_SIZE:
+            memo.clear()
+        memo[tokens] = best, 1.0 / total
+        return memo[tokens]
+
+    def to_json(self):
+        return json.dumps({
+            'alpha': self.alpha,
+            'doc_counts': self.doc_counts,
+            'token_counts': {category: counts for category, counts in self.token_counts.items() if counts},
+        })
+
+    @classmethod
+    def from_json(cls, data):
+        data = json.loads(data)
+        model = cls(alpha=data['alpha'])
+        # JSON object keys are strings; categories are ids
+        model.doc_counts = Counter({int(category): n for category, n in data['doc_counts'].items()})
+        for category, counts in data['token_counts'].items():
+            counts = Counter(counts)
+            model.token_counts[int(category)] = counts
+            model.token_totals[int(category)] = sum(counts.values())
+            model.vocabulary.update(counts)
+        return model
@@ -0,0 +1,568 @@
+"""The ``flask`` maintenance and benchmark commands.
+
+create_app() installs AppCommands as ``app.cli``, which imports this module the
+first time the CLI looks a command up. Web workers never do, so they skip it and
+the benchmark code it pulls in.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import click
+from dateutil.relativedelta import relativedelta
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func
+
+import assets
+import backups
+import benchmarks
+import exports
+import forecast
+import migrations
+import rollups
+from app import (Account, CategorizerSnapshot, Category, CategoryCache, DataVersion, ImportJob, MonthlyRollup,
+                 RecurringTransaction, Transaction, User, analytics_by_sql, app_state, create_app, db, export_query,
+                 forget_process_caches, immediate_transactions, parse_day, process_recurring_transactions,
+                 recurring_tick, run_import_job, save_categorizer_snapshot, training_rows)
+from classifier import NaiveBayesCategorizer
+
+# Commands run inside an app context, like those of app.cli
+cli = AppGroup('easy-finance')
+
+
+@cli.command('db-upgrade')
+@click.option('--target', type=int, default=None, help='Stop at this schema version.')
+def db_upgrade(target):
+    """Apply pending schema migrations."""
+    applied = migrations.upgrade(db.engine, db.metadata, target)
+    for version, description in applied:
+        click.echo(f'Applied {version}: {description}')
+    with db.engine.connect() as conn:
+        click.echo(f'Database is at schema version {migrations.current_version(conn)}.')
+
+
+@cli.command('rebuild-rollups')
+def rebuild_rollups():
+    """Regenerate the monthly rollup table from the raw transactions."""
+    with immediate_transactions(), db.engine.begin() as conn:
+        rollups.rebuild(conn, db.metadata)
+    click.echo(f'Rebuilt {MonthlyRollup.query.count()} monthly rollup rows.')
+
+
+@cli.command('backup-database')
+@click.argument('path', required=False, type=click.Path(dir_okay=False))
+def backup_database(path):
+    """Write a gzipped online backup of the SQLite database to PATH.
+
+    Web workers can keep writing meanwhile. PATH defaults to a timestamped file
+    in instance/backups.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        raise click.ClickException('Backups are only supported on SQLite; use pg_dump for PostgreSQL.')
+    if path is None:
+        directory = os.path.join(current_app.instance_path, 'backups')
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"easy-finance-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.db.gz")
+    started = time.perf_counter()
+    steps, size = backups.write_backup(db.engine, path, current_app.config['BACKUP_PAGES_PER_STEP'],
+                                       current_app.config['BACKUP_STEP_PAUSE_SECONDS'])
+    click.echo(f'Backed up {size / 2 ** 20:.1f} MB in {steps} steps and {time.perf_counter() - started:.1f} s '
+               f'to {path} ({os.path.getsize(path) / 2 ** 20:.1f} MB).')
+
+
+@cli.command('restore-backup')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--yes', is_flag=True, help='Do not ask for confirmation.')
+def restore_backup(path, yes):
+    """Replace all data in the database with the backup at PATH.
+
+    Takes a file from `flask backup-database` or GET /api/backup, gzipped or not.
+    The backup is checked first and the database is left alone if it is not
+    usable. Restart the web workers afterwards: they cache users and categorizers.
+    """
+    with db.engine.connect() as conn:
+        if migrations.current_version(conn) < migrations.LATEST_VERSION:
+            raise click.ClickException('The database schema is out of date; run `flask db-upgrade` first.')
+    if not yes:
+        click.confirm(f'Replace all data in {db.engine.url.render_as_string(hide_password=True)}?', abort=True)
+    started = time.perf_counter()
+    try:
+        result = backups.restore(db.engine, db.metadata, path)
+    except backups.SnapshotError as e:
+        raise click.ClickException(str(e))
+    forget_process_caches()
+    if result['schema_version'] < migrations.LATEST_VERSION:
+        click.echo(f"Upgraded the backup from schema version {result['schema_version']}.")
+    click.echo(f'Restored in {time.perf_counter() - started:.1f} s: ' +
+               ', '.join(f'{count} {table}' for table, count in result['rows'].items()))
+    click.echo('Restart the web workers to drop what they cached from the old data.')
+
+
+@cli.command('bench-html-parser')
+@click.option('--rows', type=int, default=20000, show_default=True, help='Transactions in the synthetic statement.')
+@click.option('--repeat', type=int, default=3, show_default=True, help='Runs per parser; the fastest is reported.')
+def bench_html_parser(rows, repeat):
+    """Compare the streaming HTML statement parser with the BeautifulSoup one."""
+    result = benchmarks.bench_html_parser(rows, repeat)
+    click.echo(f"{result['rows']} rows, {result['size_mb']:.1f} MB")
+    click.echo(f"  BeautifulSoup: {result['soup_seconds']:.2f}s")
+    click.echo(f"  streaming:     {result['fast_seconds']:.2f}s ({result['soup_seconds'] / result['fast_seconds']:.1f}x)")
+    if not result['identical']:
+        raise click.ClickException('Parsers produced different rows.')
+    click.echo('  output identical')
+
+
+@cli.command('bench-ai-categorization')
+@click.option('--descriptions', type=int, default=500, show_default=True, help='Unique descriptions to categorize.')
+@click.option('--latency', type=float, default=0.5, show_default=True, help='Seconds the stub client takes per request.')
+def bench_ai_categorization(descriptions, latency):
+    """Time chunked AI categorization against a stub client, one chunk at a time vs concurrently."""
+    result = benchmarks.bench_ai_categorization(descriptions, latency, current_app.config['AI_CHUNK_SIZE'],
+                                                current_app.config['AI_MAX_CONCURRENCY'])
+    click.echo(f"{result['descriptions']} descriptions in {result['requests']} requests of "
+               f"{current_app.config['AI_CHUNK_SIZE']}, {latency}s each")
+    click.echo(f"  one at a time: {result['sequential_seconds']:.2f}s")
+    click.echo(f"  concurrent:    {result['concurrent_seconds']:.2f}s "
+               f"(AI_MAX_CONCURRENCY={current_app.config['AI_MAX_CONCURRENCY']})")
+    click.echo(f"  categorized:   {result['categorized']}")
+    if not result['identical']:
+        raise click.ClickException('Concurrent categorization returned different answers.')
+
+
+@cli.command('train-categorizer')
+@click.option('--username', default=None, help='Only retrain this user (defaults to everybody).')
+def train_categorizer(username):
+    """Retrain the local categorizer snapshots from scratch on the categorized history."""
+    users = User.query.filter_by(username=username).all() if username else User.query.all()
+    db.session.commit()
+    with immediate_transactions():
+        for user in users:
+            model = NaiveBayesCategorizer()
+            trained_through = 0
+            for row in training_rows(user.id):
+                model.learn(row.description, row.category_id)
+                trained_through = row.id
+            save_categorizer_snapshot(user.id, model, trained_through)
+            db.session.commit()
+            app_state().categorizers.pop(user.id, None)
+            click.echo(f'{user.username}: learned {sum(model.doc_counts.values())} transactions '
+                       f'over {len(model.doc_counts)} categories.')
+
+
+@cli.command('bench-categorizer')
+@click.option('--training-rows', type=int, default=20000, show_default=True, help='Categorized history to learn.')
+@click.option('--rows', type=int, default=20000, show_default=True, help='Statement rows to categorize.')
+def bench_categorizer(training_rows, rows):
+    """Time training and prediction of the local categorizer on synthetic data."""
+    result = benchmarks.bench_local_categorizer(training_rows, rows)
+    click.echo(f"  trained on {result['training_rows']} rows in {result['train_seconds'] * 1000:.0f} ms")
+    click.echo(f"  categorized {result['rows']} rows in {result['predict_seconds'] * 1000:.0f} ms")
+    click.echo(f"  accuracy {result['accuracy']:.1%}, mean confidence {result['mean_confidence']:.3f}")
+
+
+@cli.command('recurring-tick')
+def recurring_tick_command():
+    """Post due recurring transactions once (for cron when RECURRING_SCHEDULER=off)."""
+    posted = recurring_tick()
+    if posted is None:
+        click.echo('Another worker holds the recurring scheduler lease; nothing done.')
+    else:
+        click.echo(f'Posted {posted} recurring transactions.')
+
+
+def logged_in_client(app, user_id):
+    """A test client with a session logged in as the user."""
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+    return client
+
+
+@cli.command('bench-request-overhead')
+@click.option('--requests', 'count', type=int, default=2000, show_default=True, help='Requests per run.')
+@click.option('--username', default=None, help='User to log in as (defaults to the first user).')
+def bench_request_overhead(count, username):
+    """Time GET /api/categories with and without the setup/identity caches."""
+    user = User.query.filter_by(username=username).first() if username else User.query.first()
+    if not user:
+        raise click.ClickException('No user found; create the admin account first.')
+
+    cache_enabled = current_app.config['REQUEST_BOOTSTRAP_CACHE']
+    count_header = current_app.config['QUERY_COUNT_HEADER']
+    current_app.config['QUERY_COUNT_HEADER'] = True
+    try:
+        client = logged_in_client(current_app, user.id)
+        for label, enabled in (('uncached', False), ('cached', True)):
+            current_app.config['REQUEST_BOOTSTRAP_CACHE'] = enabled
+            # Requests inside the CLI's app context would share its g and session; a
+            # fresh thread gives each request its own, as under gunicorn.
+            results = []
+            thread = threading.Thread(target=lambda: results.append(
+                benchmarks.bench_requests(client, '/api/categories', count)))
+            thread.start()
+            thread.join()
+            click.echo(f"  {label:9} {results[0]['ms_per_request']:.3f} ms/request, "
+                       f"{results[0]['queries_per_request']:.1f} queries/request")
+    finally:
+        current_app.config['REQUEST_BOOTSTRAP_CACHE'] = cache_enabled
+        current_app.config['QUERY_COUNT_HEADER'] = count_header
+
+
+@cli.command('build-assets')
+def build_assets():
+    """Write content-hashed, precompressed copies of the static assets to static/dist."""
+    manifest = assets.build(current_app.static_folder)
+    for source, hashed in sorted(manifest.items()):
+        click.echo(f'{source} -> {hashed}')
+    if assets.brotli is None:
+        click.echo('brotli is not installed; only .gz copies were written.')
+
+
+@cli.command('bench-startup')
+@click.option('--runs', type=int, default=5, show_default=True, help='Fresh interpreters to start; medians are reported.')
+@click.option('--url', default='/login', show_default=True, help='The first request.')
+def bench_startup(runs, url):
+    """Time a cold start: importing the app, create_app() and the first request."""
+    result = benchmarks.bench_startup(create_app.__module__, current_app.root_path, url, runs)
+    click.echo(f"  import:        {result['import'] * 1000:.0f} ms")
+    click.echo(f"  create_app():  {result['create_app'] * 1000:.0f} ms")
+    click.echo(f"  first request: {result['first_request'] * 1000:.0f} ms (HTTP {result['status']} for {url})")
+    click.echo(f"  whole process: {result['process'] * 1000:.0f} ms "
+               f"(the interpreter alone takes {result['interpreter'] * 1000:.0f} ms)")
+    if result['lazy_loaded']:
+        raise click.ClickException(f"Imported at startup: {', '.join(result['lazy_loaded'])}")
+
+
+@cli.command('bench-export')
+@click.option('--rows', type=int, default=100000, show_default=True, help='Transactions in the exported account.')
+@click.option('--compare/--no-compare', default=True, show_default=True,
+              help='Also build the XLSX in memory with openpyxl, as a non-streaming export would.')
+def bench_export(rows, compare):
+    """Time streaming CSV and XLSX exports of a large account and check what they contain.
+
+    Runs against the configured database as a throwaway user, deleted afterwards.
+    """
+    app = current_app._get_current_object()
+    app.config['RECURRING_SCHEDULER'] = 'off'
+    user_id = create_throwaway_user('export')
+    account = Account(name='Export', balance=0.0, user_id=user_id)
+    db.session.add(account)
+    db.session.commit()
+    account_id = account.id
+    directory = tempfile.mkdtemp(prefix='export-')
+    statement = os.path.join(directory, 'statement.html')
+    benchmarks.write_html_statement(statement, rows)
+    job = ImportJob(user_id=user_id, account_id=account_id, filename='statement.html', path=statement, use_ai=False)
+    db.session.add(job)
+    db.session.commit()
+    job_id = job.id
+    results = {}
+
+    def run():
+        # Requests inside the CLI's app context would share its g and session
+        try:
+            run_import_job(app, job_id)
+            client = logged_in_client(app, user_id)
+            for file_format in exports.FORMATS:
+                path = os.path.join(directory, f'export.{file_format}')
+                results[file_format] = benchmarks.stream_download(
+                    client, f'/api/export?format={file_format}&account_id={account_id}', path)
+                results[file_format]['rows'] = len(benchmarks.read_export(file_format, path)) - 1
+            if compare:
+                with app.app_context():
+                    results['buffered'] = benchmarks.buffered_xlsx(
+                        db.session.execute(export_query(user_id, account_id, {})),
+                        os.path.join(directory, 'buffered.xlsx'))
+        except Exception as e:
+            results['error'] = f'{type(e).__name__}: {e}'
+
+    try:
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+    finally:
+        db.session.rollback()
+        delete_user_data(user_id)
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if 'error' in results:
+        raise click.ClickException(results['error'])
+    failed = False
+    for file_format in exports.FORMATS:
+        r = results[file_format]
+        click.echo(f"  {file_format:5} first chunk after {r['first_chunk_ms']:.0f} ms, done in {r['seconds']:.2f} s, "
+                   f"{r['size_mb']:.1f} MB, {r['rows']} rows, peak memory {r['peak_mb']:.1f} MB")
+        failed |= r['status'] != 200 or r['rows'] != rows
+    if 'buffered' in results:
+        r = results['buffered']
+        click.echo(f"  xlsx built in memory with openpyxl: {r['seconds']:.2f} s, {r['size_mb']:.1f} MB, "
+                   f"peak memory {r['peak_mb']:.1f} MB")
+    if failed:
+        raise click.ClickException(f'Exports did not contain the {rows} imported rows.')
+
+
+@cli.command('bench-backup')
+@click.option('--rows', type=int, default=1000000, show_default=True, help='Transactions in the scratch database.')
+def bench_backup(rows):
+    """Time an online backup of a large database under writes, its compression and a restore.
+
+    Works on scratch SQLite databases in a temporary directory, never the
+    configured one, and fails if the restored data differs from what was backed up.
+    """
+    directory = tempfile.mkdtemp(prefix='backup-')
+    try:
+        r = benchmarks.bench_backup(db.metadata, rows, directory, current_app.config['BACKUP_PAGES_PER_STEP'],
+                                    current_app.config['BACKUP_STEP_PAUSE_SECONDS'])
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    seconds = r['seconds']
+    click.echo(f"  generated {rows} transactions in {seconds['fill']:.1f} s ({r['database_mb']:.0f} MB database)")
+    click.echo(f"  backup:   {seconds['backup']:.2f} s in {r['steps']} steps of "
+               f"{current_app.config['BACKUP_PAGES_PER_STEP']} pages, {r['restarts']} restarts")
+    click.echo(f"  writes during the backup: {r['writes']['writes']}, p50 {r['writes']['p50_ms']:.1f} ms, "
+               f"max {r['writes']['max_ms']:.1f} ms")
+    click.echo(f"  compress: {seconds['compress']:.2f} s to {r['snapshot_mb']:.0f} MB")
+    click.echo(f"  restore:  {seconds['restore']:.2f} s ({r['rows']['transaction']} transactions, "
+               f"rollups and search index rebuilt), integrity check {r['integrity']}")
+    if r['actual'] != r['expected'] or r['integrity'] != 'ok':
+        for key in r['expected']:
+            if r['actual'][key] != r['expected'][key]:
+                click.echo(f"  {key}: expected {r['expected'][key]}, got {r['actual'][key]}")
+        raise click.ClickException('The restored database differs from the backed up one.')
+
+
+@cli.command('bench-transaction-batch')
+@click.option('--rows', type=int, default=500, show_default=True, help='Transactions created and recategorized.')
+def bench_transaction_batch(rows):
+    """Time recategorizing many transactions one PUT at a time versus through /api/transactions/batch.
+
+    Runs against the configured database as a throwaway user, deleted afterwards.
+    Fails if the balance or rollups drifted from the transactions.
+    """
+    app = current_app._get_current_object()
+    app.config['RECURRING_SCHEDULER'] = 'off'
+    count_header = app.config['QUERY_COUNT_HEADER']
+    app.config['QUERY_COUNT_HEADER'] = True
+    user_id = create_throwaway_user('batch')
+    account = Account(name='Batch', balance=100.0, user_id=user_id)
+    categories = [Category(name=f'Batch {i}', type='expense', user_id=user_id) for i in range(2)]
+    db.session.add_all([account, *categories])
+    db.session.commit()
+    account_id, category_ids = account.id, [category.id for category in categories]
+    results = {}
+
+    def run():
+        # Requests inside the CLI's app context would share its g and session
+        try:
+            results.update(benchmarks.bench_transaction_batch(
+                logged_in_client(app, user_id), account_id, category_ids, rows,
+                app.config['TRANSACTIONS_BATCH_MAX_OPERATIONS']))
+        except Exception as e:
+            results['error'] = f'{type(e).__name__}: {e}'
+
+    try:
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        db.session.expire_all()
+        drift = account_drift(account_id, 100.0)
+    finally:
+        app.config['QUERY_COUNT_HEADER'] = count_header
+        db.session.rollback()
+        delete_user_data(user_id)
+
+    if 'error' in results:
+        raise click.ClickException(results['error'])
+    for phase, r in results.items():
+        click.echo(f"  {phase:28} {r['seconds'] * 1000:8.0f} ms, {r['requests']} requests, {r['queries']} queries")
+    click.echo(f"  {drift['transactions']} transactions left, balance off by {drift['balance']:g}, "
+               f"rollups off by {drift['rollup_total']:g} / {drift['rollup_count']} rows")
+    if abs(drift['balance']) > 0 or abs(drift['rollup_total']) > 1e-6 or drift['rollup_count'] != 0:
+        raise click.ClickException('Batched writes drifted from the transactions.')
+
+
+@cli.command('bench-analytics')
+@click.option('--rows', type=int, default=1000000, show_default=True,
+              help='Transactions in the scratch database, spread over ten years.')
+def bench_analytics(rows):
+    """Time /api/analytics against the SQL GROUP BY it replaces on a long history, and check they agree.
+
+    Works on a scratch SQLite database in a temporary directory, never the configured one.
+    """
+    directory = tempfile.mkdtemp(prefix='analytics-')
+    path = os.path.join(directory, 'analytics.db')
+    results = {}
+    try:
+        started = time.perf_counter()
+        engine = benchmarks.scratch_database(path, db.metadata)
+        user_id = benchmarks.fill_database(engine, db.metadata, rows)
+        engine.dispose()
+        fill_seconds = time.perf_counter() - started
+        scratch = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'ASSETS_BUILD': False,
+                              'RECURRING_SCHEDULER': 'off'})
+        with scratch.app_context():
+            first_account = db.session.scalar(db.select(func.min(Account.id)).where(Account.user_id == user_id))
+        queries = [{'granularity': granularity, 'group_by': group_by}
+                   for granularity in ('month', 'week', 'day', 'year') for group_by in ('category', 'account', 'type')]
+        queries.append({'granularity': 'week', 'group_by': 'category', 'account_id': first_account})
+        queries.append({'granularity': 'day', 'group_by': 'type', 'start_date': '2020-03-01', 'end_date': '2020-03-31'})
+
+        def reference(body):
+            with scratch.app_context():
+                return analytics_by_sql(user_id, parse_day(body['start_date']), parse_day(body['end_date']),
+                                        body['granularity'], body['group_by'], body['account_id'])
+
+        def run():
+            # Requests inside the CLI's app context would share its g and session
+            try:
+                results.update(benchmarks.bench_analytics(logged_in_client(scratch, user_id), reference, queries))
+                results['snapshot_mb'] = scratch.extensions['easy_finance'].analytics[user_id][1].nbytes / 2 ** 20
+            except Exception as e:
+                results['error'] = f'{type(e).__name__}: {e}'
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        with scratch.app_context():
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if 'error' in results:
+        raise click.ClickException(results['error'])
+    click.echo(f"  generated {rows} transactions in {fill_seconds:.1f} s")
+    click.echo(f"  first request (loads a {results['snapshot_mb']:.0f} MB snapshot): {results['first_request_ms']:.0f} ms")
+    click.echo(f"  {'query':60} {'periods':>7} {'series':>6} {'api':>9} {'sql':>9}")
+    for r in results['queries']:
+        query = ' '.join(f'{key}={value}' for key, value in r['params'].items())
+        click.echo(f"  {query:60} {r['periods']:7} {r['series']:6} {r['api_ms']:6.1f} ms {r['sql_ms']:6.0f} ms"
+                   f"{'' if r['agree'] else '  DIFFERENT'}")
+    if not all(r['agree'] for r in results['queries']):
+        raise click.ClickException('/api/analytics and the SQL GROUP BY disagree.')
+
+
+@cli.command('bench-forecast')
+@click.option('--rules', 'rule_count', type=int, default=1000, show_default=True, help='Recurring rules of the user.')
+@click.option('--years', type=int, default=10, show_default=True, help='How far ahead to forecast.')
+@click.option('--post-days', type=int, default=365, show_default=True,
+              help='Days of occurrences to actually post afterwards, to compare the balances with.')
+def bench_forecast(rule_count, years, post_days):
+    """Time /api/forecast over many rules and years and check it against posting the occurrences.
+
+    Works on a scratch SQLite database in a temporary directory, never the
+    configured one. The forecast is compared day by day with adding up every
+    occurrence one at a time, and its balances after ``--post-days`` with what
+    the recurring scheduler leaves in the accounts after posting that far.
+    """
+    # Sums of many amounts in a different order differ in their last bits
+    relative_difference = lambda a, b: abs(a - b) / max(1.0, abs(b))
+    directory = tempfile.mkdtemp(prefix='forecast-')
+    path = os.path.join(directory, 'forecast.db')
+    today = datetime.utcnow().date()
+    last_day = today + relativedelta(years=years)
+    post_until = today + timedelta(days=post_days)
+    results = {}
+    try:
+        engine = benchmarks.scratch_database(path, db.metadata)
+        user_id = benchmarks.fill_database(engine, db.metadata, 1000)
+        benchmarks.add_recurring_rules(engine, db.metadata, user_id, rule_count, today)
+        engine.dispose()
+        scratch = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'ASSETS_BUILD': False,
+                              'RECURRING_SCHEDULER': 'off'})
+
+        def run():
+            # Requests inside the CLI's app context would share its g and session
+            try:
+                client = logged_in_client(scratch, user_id)
+                params = {'end_date': last_day.isoformat()}
+                results['api'], response = benchmarks.best_of(5, lambda: client.get('/api/forecast', query_string=params))
+                if response.status_code != 200:
+                    raise RuntimeError(f'/api/forecast answered {response.status_code}: {response.get_data(as_text=True)}')
+                body = response.get_json()
+                results['occurrences'] = sum(rule['occurrences'] for rule in body['rules'])
+                with scratch.app_context():
+                    rules = RecurringTransaction.query.filter_by(user_id=user_id, is_active=True).all()
+                    balances = {account.id: account.balance for account in
+                                Account.query.filter_by(user_id=user_id).order_by(Account.name)}
+                    results['project'], _ = benchmarks.best_of(5, forecast.project, rules, balances, today, last_day)
+                    started = time.perf_counter()
+                    expected = benchmarks.forecast_by_occurrences(rules, balances, today, last_day)
+                    results['loop'] = time.perf_counter() - started
+                    results['difference'] = max((relative_difference(a, b) for account in body['accounts']
+                                                 for a, b in zip(account['balances'], expected[account['id']])), default=0.0)
+
+                    projected, _ = forecast.project(rules, balances, today, post_until)
+                    started = time.perf_counter()
+                    results['posted'] = process_recurring_transactions(post_until)
+                    results['post'] = time.perf_counter() - started
+                    posted = dict(db.session.execute(db.select(Account.id, Account.balance)
+                                                     .where(Account.user_id == user_id)).all())
+                    results['post_difference'] = max((relative_difference(row[-1], posted[account_id])
+                                                       for account_id, row in zip(balances, projected)), default=0.0)
+            except Exception as e:
+                results['error'] = f'{type(e).__name__}: {e}'
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        with scratch.app_context():
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if 'error' in results:
+        raise click.ClickException(results['error'])
+    click.echo(f"  {rule_count} rules, {years} years: {results['occurrences']} occurrences")
+    click.echo(f"  GET /api/forecast:         {results['api'] * 1000:7.1f} ms")
+    click.echo(f"  forecast.project():        {results['project'] * 1000:7.1f} ms")
+    click.echo(f"  one occurrence at a time:  {results['loop'] * 1000:7.1f} ms, "
+               f"largest relative difference {results['difference']:.2g}")
+    click.echo(f"  posting {post_days} days ({results['posted']} transactions): {results['post']:.2f} s, "
+               f"balances differ from the forecast by at most {results['post_difference']:.2g} (relative)")
+    if results['difference'] > 1e-9 or results['post_difference'] > 1e-9:
+        raise click.ClickException('The forecast differs from posting the occurrences.')
+
+
+def create_throwaway_user(prefix):
+    """Add a user with a random name and password for a check or benchmark; returns the id."""
+    user = User(username=f'{prefix}-{uuid.uuid4().hex[:8]}')
+    user.set_password(uuid.uuid4().hex)
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def delete_user_data(user_id):
+    """Delete a user and everything they own."""
+    account_ids = [account_id for account_id, in db.session.query(Account.id).filter_by(user_id=user_id)]
+    Transaction.query.filter(Transaction.account_id.in_(account_ids)).delete()
+    for model in (RecurringTransaction, MonthlyRollup, ImportJob, CategoryCache, CategorizerSnapshot, DataVersion,
+                  Category, Account):
+        model.query.filter_by(user_id=user_id).delete()
+    User.query.filter_by(id=user_id).delete()
+    db.session.commit()
+    app_state().categorizers.pop(user_id, None)
+    app_state().analytics.pop(user_id, None)
+
+
+def account_drift(account_id, opening_balance):
+    """How far an account's balance and rollups are from the sum of its transactions."""
+    total, count = db.session.query(func.coalesce(func.sum(Transaction.amount), 0.0), func.count(Transaction.id))\
+        .filter(Transaction.account_id == account_id).one()
+    rolled_total, rolled_count = db.session.query(
+        func.coalesce(func.sum(MonthlyRollup.income + MonthlyRollup.expense), 0.0),
+        func.coalesce(func.sum(MonthlyRollup.count), 0))\
+        .filter(MonthlyRollup.account_id == account_id).one()
+    balance = db.session.scalar(db.select(Account.balance).where(Account.id == account_id))
+    return {
+        'transactions': count,
+        'balance': balance - (opening_balance + total),
+        'rollup_total': rolled_total - total,
+        'rollup_count': rolled_count - count,
+    }
@@ -0,0 +1,160 @@
+"""Streaming CSV and XLSX writers for /api/export.
+
+Both take the columns and an iterable of row batches and yield the file
+in chunks as the batches come in, so an export starts downloading at once and
+never holds more than a batch in memory, however many rows it has. ``columns``
+are ``(name, width)`` pairs; the width (in characters) is only used by XLSX.
+Cells are ``datetime`` (written as a date), ``float`` or ``str``/None.
+
+openpyxl's write-only workbook keeps memory flat too, but it spools the sheet
+to a temporary file and only produces the zip when it is saved, after the last
+row. The XLSX writer here emits a minimal SpreadsheetML package instead (inline
+strings, no shared string table) through ``zipfile``, which can write to a
+stream that cannot seek.
+"""
+import csv
+import io
+import math
+import re
+import zipfile
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+# Control characters are not allowed in XML at all
+XML_ILLEGAL = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+# Spreadsheets run cells starting with these as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+EXCEL_EPOCH = datetime(1899, 12, 30)
+
+SPREADSHEET_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+RELATIONSHIP_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>
+</Types>"""
+
+ROOT_RELS = f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="{RELATIONSHIP_NS}/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+
+WORKBOOK_RELS = f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="{RELATIONSHIP_NS}/worksheet" Target="worksheets/sheet1.xml"/>
+<Relationship Id="rId2" Type="{RELATIONSHIP_NS}/styles" Target="styles.xml"/>
+</Relationships>"""
+
+# Cell styles: 0 plain, 1 date, 2 amount, 3 bold (the header row)
+STYLES = f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="{SPREADSHEET_NS}">
+<numFmts count="1"><numFmt numFmtId="164" formatCode="yyyy-mm-dd"/></numFmts>
+<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font><font><b/><sz val="11"/><name val="Calibri"/></font></fonts>
+<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>
+<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="4">
+<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>
+<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+<xf numFmtId="4" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>
+</cellXfs>
+<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>
+</styleSheet>"""
+
+
+def _csv_cell(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_chunks(columns, batches):
+    """Yield a UTF-8 CSV file, one chunk per batch."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')  # Excel only reads the file as UTF-8 with a byte order mark
+    writer.writerow([name for name, width in columns])
+    for batch in batches:
+        writer.writerows([_csv_cell(value) for value in row] for row in batch)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def _xlsx_cell(value):
+    if value is None:
+        return '<c/>'
+    if isinstance(value, datetime):
+        return f'<c s="1"><v>{(value - EXCEL_EPOCH).days}</v></c>'
+    if isinstance(value, (int, float)):
+        if math.isfinite(value):
+            return f'<c s="2"><v>{value!r}</v></c>'
+        # A <v> must hold a number; write inf and nan as text, as the CSV does
+        value = str(value)
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(XML_ILLEGAL.sub("", value))}</t></is></c>'
+
+
+class _Sink(io.RawIOBase):
+    """A write-only stream that keeps what is written until it is drained."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def xlsx_chunks(columns, batches, sheet_name='Transactions'):
+    """Yield an XLSX workbook of one sheet with a frozen header row, one chunk per batch."""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as package:
+        package.writestr('[Content_Types].xml', CONTENT_TYPES)
+        package.writestr('_rels/.rels', ROOT_RELS)
+        package.writestr('xl/_rels/workbook.xml.rels', WORKBOOK_RELS)
+        package.writestr('xl/styles.xml', STYLES)
+        package.writestr('xl/workbook.xml', f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="{SPREADSHEET_NS}" xmlns:r="{RELATIONSHIP_NS}">
+<sheets><sheet name="{escape(sheet_name[:31])}" sheetId="1" r:id="rId1"/></sheets>
+</workbook>""")
+        cols = ''.join(f'<col min="{i}" max="{i}" width="{width}" customWidth="1"/>'
+                       for i, (name, width) in enumerate(columns, 1))
+        with package.open('xl/worksheets/sheet1.xml', 'w') as sheet:
+            header = ''.join(f'<c t="inlineStr" s="3"><is><t>{escape(name)}</t></is></c>' for name, width in columns)
+            sheet.write(f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<worksheet xmlns="{SPREADSHEET_NS}"><sheetViews><sheetView workbookViewId="0">
+<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/></sheetView></sheetViews>
+<cols>{cols}</cols><sheetData><row r="1">{header}</row>""".encode('utf-8'))
+            number = 1
+            for batch in batches:
+                xml = []
+                for row in batch:
+                    number += 1
+                    xml.append(f'<row r="{number}">{"".join(map(_xlsx_cell, row))}</row>')
+                sheet.write(''.join(xml).encode('utf-8'))
+                yield sink.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield sink.drain()
+
+
+# format -> (writer, mimetype)
+FORMATS = {
+    'csv': (csv_chunks, 'text/csv'),
+    'xlsx': (xlsx_chunks, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
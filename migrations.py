@@ -0,0 +1,229 @@
+"""Versioned schema migrations.
+
+Each step is a ``(version, description, function)`` tuple. ``upgrade`` runs the
+steps newer than the version recorded in the ``schema_version`` table, in order,
+each inside its own transaction. Steps receive the connection and the models'
+``MetaData`` and must be safe to run against databases created before this
+runner existed (the old startup code used ``create_all`` plus ad-hoc ALTERs).
+"""
+import logging
+from datetime import datetime
+
+import sqlalchemy as sa
+from sqlalchemy.schema import CreateIndex
+
+import rollups
+import search
+from statements import transaction_fingerprint
+
+schema_version = sa.Table(
+    'schema_version', sa.MetaData(),
+    sa.Column('version', sa.Integer, primary_key=True),
+    sa.Column('description', sa.String(200), nullable=False),
+    sa.Column('applied_at', sa.DateTime, nullable=False),
+)
+
+
+def quote(conn, name):
+    return conn.dialect.identifier_preparer.quote(name)
+
+
+def add_column_if_missing(conn, table, column, ddl):
+    columns = {c['name'] for c in sa.inspect(conn).get_columns(table)}
+    if column not in columns:
+        conn.execute(sa.text(f'ALTER TABLE {quote(conn, table)} ADD COLUMN {column} {ddl}'))
+
+
+def create_tables(conn, metadata, *names):
+    metadata.create_all(conn, tables=[metadata.tables[name] for name in names], checkfirst=True)
+
+
+def create_indexes(conn, metadata, table, *names):
+    for index in metadata.tables[table].indexes:
+        if index.name in names:
+            # Not checkfirst: reflection skips expression indexes such as abs(amount)
+            conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+def _initial_tables(conn, metadata):
+    # The tables as first released. Not the models: the later steps add their columns and indexes.
+    baseline = sa.MetaData()
+    sa.Table(
+        'user', baseline,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('username', sa.String(150), unique=True, nullable=False),
+        sa.Column('password_hash', sa.String(150), nullable=False),
+        sa.Column('currency', sa.String(5), nullable=False),
+    )
+    sa.Table(
+        'account', baseline,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('name', sa.String(100), nullable=False),
+        sa.Column('type', sa.String(50), nullable=False),
+        sa.Column('balance', sa.Float, nullable=False),
+        sa.Column('user_id', sa.Integer, sa.ForeignKey('user.id'), nullable=False),
+    )
+    sa.Table(
+        'category', baseline,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('name', sa.String(50), nullable=False),
+        sa.Column('type', sa.String(10), nullable=False),
+        sa.Column('user_id', sa.Integer, sa.ForeignKey('user.id'), nullable=False),
+    )
+    sa.Table(
+        'transaction', baseline,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('description', sa.String(100), nullable=False),
+        sa.Column('amount', sa.Float, nullable=False),
+        sa.Column('date', sa.DateTime, nullable=False),
+        sa.Column('account_id', sa.Integer, sa.ForeignKey('account.id'), nullable=False),
+        sa.Column('category_id', sa.Integer, sa.ForeignKey('category.id'), nullable=True),
+    )
+    sa.Table(
+        'recurring_transaction', baseline,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('name', sa.String(100), nullable=False),
+        sa.Column('amount', sa.Float, nullable=False),
+        sa.Column('frequency', sa.String(10), nullable=False),
+        sa.Column('start_date', sa.DateTime, nullable=False),
+        sa.Column('next_due_date', sa.DateTime, nullable=False),
+        sa.Column('end_date', sa.DateTime),
+        sa.Column('account_id', sa.Integer, sa.ForeignKey('account.id'), nullable=False),
+        sa.Column('category_id', sa.Integer, sa.ForeignKey('category.id')),
+        sa.Column('user_id', sa.Integer, sa.ForeignKey('user.id'), nullable=False),
+        sa.Column('is_active', sa.Boolean, nullable=False),
+    )
+    baseline.create_all(conn, checkfirst=True)
+
+
+def _user_and_debt_columns(conn, metadata):
+    add_column_if_missing(conn, 'user', 'gemini_api_key', 'VARCHAR(255)')
+    add_column_if_missing(conn, 'recurring_transaction', 'payment_type', "VARCHAR(10) NOT NULL DEFAULT 'standard'")
+    add_column_if_missing(conn, 'recurring_transaction', 'total_amount', 'FLOAT')
+    add_column_if_missing(conn, 'recurring_transaction', 'paid_amount', 'FLOAT NOT NULL DEFAULT 0.0')
+
+
+def _hot_path_indexes(conn, metadata):
+    create_indexes(conn, metadata, 'account', 'ix_account_user')
+    create_indexes(conn, metadata, 'category', 'ix_category_user_name')
+    create_indexes(conn, metadata, 'transaction', 'ix_transaction_account_date')
+    create_indexes(conn, metadata, 'recurring_transaction', 'ix_recurring_user_active_due')
+
+
+def _monthly_rollups(conn, metadata):
+    create_tables(conn, metadata, 'monthly_rollup')
+    rollups.rebuild(conn, metadata)
+
+
+def _transaction_fingerprints(conn, metadata, batch_size=5000):
+    transaction = metadata.tables['transaction']
+    add_column_if_missing(conn, 'transaction', 'fingerprint', 'VARCHAR(40)')
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(transaction.c.id, transaction.c.date, transaction.c.amount, transaction.c.description)
+            .where(transaction.c.id > last_id)
+            .order_by(transaction.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        conn.execute(
+            transaction.update().where(transaction.c.id == sa.bindparam('row_id')).values(fingerprint=sa.bindparam('fp')),
+            [{'row_id': r.id, 'fp': transaction_fingerprint(r.date, r.amount, r.description)} for r in rows]
+        )
+        last_id = rows[-1].id
+    create_indexes(conn, metadata, 'transaction', 'ix_transaction_fingerprint')
+    # Superseded by the fingerprint index
+    conn.execute(sa.text('DROP INDEX IF EXISTS ix_transaction_dedupe'))
+
+
+def _import_jobs(conn, metadata):
+    create_tables(conn, metadata, 'import_job')
+
+
+def _category_cache(conn, metadata):
+    create_tables(conn, metadata, 'category_cache')
+
+
+def _local_categorizer(conn, metadata):
+    add_column_if_missing(conn, 'transaction', 'category_confidence', 'FLOAT')
+    create_tables(conn, metadata, 'categorizer_snapshot')
+
+
+def _recurring_scheduler(conn, metadata):
+    add_column_if_missing(conn, 'transaction', 'recurring_id', 'INTEGER REFERENCES recurring_transaction (id)')
+    create_indexes(conn, metadata, 'transaction', 'ix_transaction_recurring_date')
+    create_indexes(conn, metadata, 'recurring_transaction', 'ix_recurring_active_due')
+    create_tables(conn, metadata, 'scheduler_lease')
+
+
+def _data_versions(conn, metadata):
+    create_tables(conn, metadata, 'data_version')
+
+
+def _transaction_search(conn, metadata):
+    if not search.create_index(conn):
+        logging.warning('SQLite was built without FTS5; transaction search will scan instead.')
+    create_indexes(conn, metadata, 'transaction', 'ix_transaction_account_abs_amount', 'ix_transaction_category_date')
+
+
+def _unique_rollup_buckets(conn, metadata):
+    # Rows added by concurrent writers may have split a bucket in two
+    rollups.rebuild(conn, metadata)
+    create_indexes(conn, metadata, 'monthly_rollup', 'ix_rollup_bucket')
+
+
+
+def _search_insert_trigger(conn, metadata):
+    # Rows inserted by code that did not index them were never searchable; the rebuild adds them
+    if search.has_table(conn):
+        search.create_index(conn)
+
+
+MIGRATIONS = [
+    (1, 'Create initial tables', _initial_tables),
+    (2, 'Add gemini_api_key and debt payment columns', _user_and_debt_columns),
+    (3, 'Add indexes for transaction hot paths', _hot_path_indexes),
+    (4, 'Create and backfill monthly rollups', _monthly_rollups),
+    (5, 'Add and backfill transaction fingerprints', _transaction_fingerprints),
+    (6, 'Create import job table', _import_jobs),
+    (7, 'Create AI category cache table', _category_cache),
+    (8, 'Add local categorizer confidence and snapshots', _local_categorizer),
+    (9, 'Add recurring scheduler lease and occurrence guard', _recurring_scheduler),
+    (10, 'Create per-user data version table', _data_versions),
+    (11, 'Add full-text search and amount/category indexes for transactions', _transaction_search),
+    (12, 'Rebuild monthly rollups with a unique index per bucket', _unique_rollup_buckets),
+    (13, 'Index new transactions for search with an insert trigger', _search_insert_trigger),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    """Return the applied schema version, or 0 for an unversioned database."""
+    if not sa.inspect(conn).has_table('schema_version'):
+        return 0
+    return conn.execute(sa.select(sa.func.max(schema_version.c.version))).scalar() or 0
+
+
+def upgrade(engine, metadata, target=None):
+    """Apply pending migrations up to ``target`` (default: latest). Returns the steps applied."""
+    target = LATEST_VERSION if target is None else target
+    with engine.begin() as conn:
+        schema_version.create(conn, checkfirst=True)
+
+    applied = []
+    for version, description, step in MIGRATIONS:
+        if version > target:
+            break
+        with engine.begin() as conn:
+            if version <= current_version(conn):
+                continue
+            logging.info(f"Applying migration {version}: {description}")
+            step(conn, metadata)
+            conn.execute(schema_version.insert().values(
+                version=version, description=description, applied_at=datetime.utcnow()
+            ))
+        applied.append((version, description))
+    return applied
@@ -0,0 +1,87 @@
+"""Closed-form occurrence arithmetic for recurring transactions.
+
+Occurrence ``k`` of a rule is ``start + k`` periods, counted from the rule's
+start date rather than from the previous occurrence, so a rule starting on
+the 31st clamps to the last day of shorter months and returns to the 31st
+afterwards. Every function here is O(1) in the number of periods skipped
+(except ``occurrences``, which is linear in what it returns).
+
+Dates are compared by calendar day, like the rest of the recurring code.
+"""
+import math
+from datetime import timedelta
+
+from dateutil.relativedelta import relativedelta
+
+# Frequency -> (days, months) per period
+PERIODS = {
+    'daily': (1, 0),
+    'weekly': (7, 0),
+    'monthly': (0, 1),
+    'yearly': (0, 12),
+}
+FREQUENCIES = tuple(PERIODS)
+
+
+def occurrence(start, frequency, index):
+    """The ``index``-th occurrence (0 is ``start``)."""
+    days, months = PERIODS[frequency]
+    if months:
+        return start + relativedelta(months=months * index)  # Clamps to the end of the month
+    return start + timedelta(days=days * index)
+
+
+def first_index_on_or_after(start, frequency, day):
+    """Index of the first occurrence whose date is ``day`` or later."""
+    if start.date() >= day:
+        return 0
+    days, months = PERIODS[frequency]
+    if months:
+        elapsed = (day.year - start.year) * 12 + day.month - start.month
+        index = elapsed // months
+    else:
+        index = (day - start.date()).days // days
+    # Clamping only ever moves an occurrence earlier, so at most one step is missing
+    while occurrence(start, frequency, index).date() < day:
+        index += 1
+    return index
+
+
+def next_on_or_after(start, frequency, day):
+    """First occurrence on ``day`` or later."""
+    return occurrence(start, frequency, first_index_on_or_after(start, frequency, day))
+
+
+def occurrences(start, frequency, first_day, last_day):
+    """All occurrences dated from ``first_day`` through ``last_day`` (inclusive)."""
+    index = first_index_on_or_after(start, frequency, first_day)
+    end = first_index_on_or_after(start, frequency, last_day + timedelta(days=1))
+    return [occurrence(start, frequency, i) for i in range(index, end)]
+
+
+def payments_to_pay_off(payment, total_amount, paid_amount):
+    """How many payments of ``payment`` pay off what remains of a debt; None if they never do."""
+    payment = abs(payment)
+    remaining = total_amount - paid_amount
+    if remaining <= 0:
+        return 0
+    if payment == 0:
+        return None
+    # Round away float noise such as 0.3 / 0.1 == 2.9999999999999996
+    return math.ceil(round(remaining / payment, 9))
+
+
+def debt_payments(payment, total_amount, paid_amount, count):
+    """Amounts of up to ``count`` payments toward a debt, the last one capped at what remains.
+
+    Returns fewer than ``count`` amounts once the debt is paid off.
+    """
+    payment = abs(payment)
+    needed = payments_to_pay_off(payment, total_amount, paid_amount)
+    if needed == 0:
+        return []
+    if needed is None:
+        return [0.0] * count
+    if count < needed:
+        return [payment] * count
+    return [payment] * (needed - 1) + [total_amount - paid_amount - payment * (needed - 1)]
@@ -0,0 +1,102 @@
+"""Monthly income/expense rollups per (user, account, category, year, month).
+
+Write paths collect their changes in a ``RollupDeltas`` and apply them in the
+same transaction as the transaction rows themselves; ``rebuild`` regenerates
+the whole table from the raw transactions.
+"""
+from collections import defaultdict
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, scoped_session
+
+# One row per bucket, enforced by the unique ix_rollup_bucket index. Category ids
+# start at 1, so uncategorized transactions (NULL) get a bucket of their own as 0.
+BUCKET_KEY = ('account_id', sa.text('coalesce(category_id, 0)'), 'year', 'month')
+
+
+class RollupDeltas:
+    def __init__(self):
+        self.deltas = defaultdict(lambda: [0.0, 0.0, 0])
+
+    def add(self, account_id, category_id, date, amount, sign=1):
+        """Record a transaction being added (sign=1) or removed (sign=-1)."""
+        amount = float(amount)
+        delta = self.deltas[(account_id, category_id, date.year, date.month)]
+        if amount > 0:
+            delta[0] += sign * amount
+        elif amount < 0:
+            delta[1] += sign * amount
+        delta[2] += sign
+
+    def remove(self, account_id, category_id, date, amount):
+        self.add(account_id, category_id, date, amount, sign=-1)
+
+    def add_totals(self, account_id, category_id, year, month, income, expense, count):
+        delta = self.deltas[(account_id, category_id, year, month)]
+        delta[0] += income
+        delta[1] += expense
+        delta[2] += count
+
+    def apply(self, conn, metadata, user_id):
+        """Upsert the accumulated deltas. ``conn`` may be a Connection or Session.
+
+        Each bucket is a single INSERT ... ON CONFLICT DO UPDATE, so writers
+        adding to a new bucket at the same time cannot both insert it.
+        """
+        rollup = metadata.tables['monthly_rollup']
+        bind = conn.get_bind() if isinstance(conn, (Session, scoped_session)) else conn
+        dialect = postgresql if bind.dialect.name == 'postgresql' else sqlite
+        for (account_id, category_id, year, month), (income, expense, count) in self.deltas.items():
+            if not (income or expense or count):
+                continue
+            insert = dialect.insert(rollup).values(
+                user_id=user_id, account_id=account_id, category_id=category_id,
+                year=year, month=month, income=income, expense=expense, count=count
+            )
+            conn.execute(insert.on_conflict_do_update(
+                index_elements=BUCKET_KEY,
+                set_={'income': rollup.c.income + insert.excluded.income,
+                      'expense': rollup.c.expense + insert.excluded.expense,
+                      'count': rollup.c.count + insert.excluded.count},
+            ))
+            if count < 0:
+                category_filter = rollup.c.category_id.is_(None) if category_id is None else rollup.c.category_id == category_id
+                # Drop emptied buckets rather than keep float residue around
+                conn.execute(rollup.delete().where(
+                    rollup.c.account_id == account_id, category_filter,
+                    rollup.c.year == year, rollup.c.month == month, rollup.c.count <= 0
+                ))
+        self.deltas.clear()
+
+
+def rebuild(conn, metadata, user_id=None):
+    """Regenerate the rollup rows (for one user, or everybody) from the transactions."""
+    rollup = metadata.tables['monthly_rollup']
+    transaction = metadata.tables['transaction']
+    account = metadata.tables['account']
+
+    delete = rollup.delete()
+    if user_id is not None:
+        delete = delete.where(rollup.c.user_id == user_id)
+    conn.execute(delete)
+
+    year = sa.cast(sa.extract('year', transaction.c.date), sa.Integer)
+    month = sa.cast(sa.extract('month', transaction.c.date), sa.Integer)
+    select = sa.select(
+        account.c.user_id,
+        transaction.c.account_id,
+        transaction.c.category_id,
+        year,
+        month,
+        sa.func.sum(sa.case((transaction.c.amount > 0, transaction.c.amount), else_=0.0)),
+        sa.func.sum(sa.case((transaction.c.amount < 0, transaction.c.amount), else_=0.0)),
+        sa.func.count(),
+    ).join(account, transaction.c.account_id == account.c.id) \
+     .group_by(account.c.user_id, transaction.c.account_id, transaction.c.category_id, year, month)
+    if user_id is not None:
+        select = select.where(account.c.user_id == user_id)
+
+    conn.execute(rollup.insert().from_select(
+        ['user_id', 'account_id', 'category_id', 'year', 'month', 'income', 'expense', 'count'], select
+    ))
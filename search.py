@@ -0,0 +1,123 @@
+"""Full-text search over transaction descriptions.
+
+SQLite keeps an FTS5 index (``transaction_search``, external content over the
+transaction table) in sync with triggers. A trigger costs about five times as
+much per row as a bulk insert, so imports drop the insert trigger around their
+batches (``bulk_insert``) and index the new rows in one statement instead.
+PostgreSQL uses a GIN index on
+``to_tsvector('simple', description)`` and needs neither.
+Both match words by prefix and ignore case, so ``cof`` finds "Coffee" but
+``fee`` does not. Category names are few per user and are matched the same way
+in Python.
+
+A SQLite build without FTS5 gets no index; ``has_index`` then reports False and
+callers fall back to a LIKE scan.
+"""
+import re
+import unicodedata
+from contextlib import contextmanager
+
+import sqlalchemy as sa
+
+TERM = re.compile(r'[^\W_]+')
+COMBINING_MARKS = re.compile(r'[\u0300-\u036f]')
+
+search_table = sa.table('transaction_search', sa.column('rowid'), sa.column('description'),
+                        sa.column('transaction_search'))
+
+INSERT_TRIGGER = """CREATE TRIGGER IF NOT EXISTS transaction_search_insert AFTER INSERT ON "transaction" BEGIN
+        INSERT INTO transaction_search (rowid, description) VALUES (new.id, new.description);
+    END"""
+
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS transaction_search USING fts5(
+        description, content='transaction', content_rowid='id', tokenize='unicode61 remove_diacritics 2')""",
+    INSERT_TRIGGER,
+    """CREATE TRIGGER IF NOT EXISTS transaction_search_delete AFTER DELETE ON "transaction" BEGIN
+        INSERT INTO transaction_search (transaction_search, rowid, description) VALUES ('delete', old.id, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS transaction_search_update AFTER UPDATE OF description ON "transaction" BEGIN
+        INSERT INTO transaction_search (transaction_search, rowid, description) VALUES ('delete', old.id, old.description);
+        INSERT INTO transaction_search (rowid, description) VALUES (new.id, new.description);
+    END""",
+    "INSERT INTO transaction_search (transaction_search) VALUES ('rebuild')",
+]
+
+POSTGRESQL_DDL = [
+    """CREATE INDEX IF NOT EXISTS ix_transaction_description_search
+        ON "transaction" USING gin (to_tsvector('simple', description))""",
+]
+
+
+def terms(text):
+    """The words of a search box entry, each of which must match."""
+    return TERM.findall(text)
+
+
+def fold(word):
+    """Lower-case ``word`` without accents, as the SQLite tokenizer sees it."""
+    return COMBINING_MARKS.sub('', unicodedata.normalize('NFKD', word.lower()))
+
+
+def name_matches(name, term):
+    """Whether a word of ``name`` starts with ``term``."""
+    term = fold(term)
+    return any(word.startswith(term) for word in map(fold, TERM.findall(name)))
+
+
+def create_index(conn):
+    """Create (and fill) the search index. Returns False if this SQLite has no FTS5."""
+    if conn.dialect.name == 'postgresql':
+        statements = POSTGRESQL_DDL
+    else:
+        if not conn.exec_driver_sql("SELECT sqlite_compileoption_used('ENABLE_FTS5')").scalar():
+            return False
+        statements = SQLITE_DDL
+    for statement in statements:
+        conn.exec_driver_sql(statement)
+    return True
+
+
+def drop_triggers(conn):
+    """Stop syncing the SQLite index, e.g. to replace every transaction; ``create_index`` restores it."""
+    conn.exec_driver_sql('DROP TRIGGER IF EXISTS transaction_search_insert')
+    conn.exec_driver_sql('DROP TRIGGER IF EXISTS transaction_search_delete')
+    conn.exec_driver_sql('DROP TRIGGER IF EXISTS transaction_search_update')
+
+
+def has_index(conn):
+    return conn.dialect.name == 'postgresql' or sa.inspect(conn).has_table('transaction_search')
+
+
+def has_table(conn):
+    """Whether this is an SQLite database with the FTS5 index, which ``bulk_insert`` has to maintain."""
+    return conn.dialect.name == 'sqlite' and sa.inspect(conn).has_table('transaction_search')
+
+
+def add_rows(conn, rows):
+    """Index newly inserted transactions, given as ``(id, description)`` pairs."""
+    if rows:
+        conn.execute(search_table.insert(), [{'rowid': id, 'description': description} for id, description in rows])
+
+
+@contextmanager
+def bulk_insert(conn):
+    """Insert transactions without the insert trigger; pass them to ``add_rows`` before leaving.
+
+    The trigger is dropped and restored inside the caller's transaction, which holds the
+    write lock, so no other writer ever inserts while it is missing.
+    """
+    conn.exec_driver_sql('DROP TRIGGER IF EXISTS transaction_search_insert')
+    yield
+    conn.exec_driver_sql(INSERT_TRIGGER)
+
+
+def description_matches(dialect_name, description, transaction_id, term):
+    """Condition for transactions whose ``description`` has a word starting with ``term``."""
+    if dialect_name == 'postgresql':
+        # Must repeat the indexed expression exactly
+        return sa.func.to_tsvector('simple', description).op('@@')(sa.func.to_tsquery('simple', f'{term}:*'))
+    # Quoted, so FTS5 query syntax in the term is taken literally
+    return transaction_id.in_(
+        sa.select(search_table.c.rowid).where(search_table.c.transaction_search.match(f'"{term}"*'))
+    )
@@ -0,0 +1,538 @@
+"""Bank statement parsing for /api/upload.
+
+The parsers take the path of the spooled upload, yield
+``{'date', 'description', 'amount'}`` dicts one row at a time and raise
+``StatementError`` when the file does not look like a statement.
+"""
+import codecs
+import hashlib
+import html
+import re
+from datetime import datetime
+
+
+class StatementError(Exception):
+    pass
+
+
+def parse_turkish_amount(amount_str):
+    if not amount_str:
+        return 0.0
+    # Remove dots (thousands separator) and replace comma with dot (decimal separator)
+    clean_str = amount_str.replace('.', '').replace(',', '.')
+    # Remove any non-numeric chars except the decimal dot and minus sign
+    clean_str = re.sub(r'[^\d.-]', '', clean_str)
+    try:
+        return float(clean_str)
+    except ValueError:
+        return 0.0
+
+
+def normalize_description(description):
+    """Case- and whitespace-insensitive form of a description."""
+    return ' '.join((description or '').split()).casefold()
+
+
+def transaction_fingerprint(date, amount, description):
+    """Normalized identity of a transaction, used to skip duplicates on import.
+
+    Whitespace and case differences in the description and float noise in the
+    amount do not change the fingerprint.
+    """
+    normalized = '|'.join([
+        date.isoformat(),
+        f'{round(float(amount), 2) + 0.0:.2f}',
+        normalize_description(description),
+    ])
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+HTML_READ_CHUNK_SIZE = 64 * 1024
+
+HTML_META_CHARSET = re.compile(rb'<\s*meta[^>]+charset\s*=\s*["\']?([^>]*?)[ /;\'">]', re.I)
+
+
+def find_header_columns(headers):
+    """Return the (date, description, amount) column indexes, or None if any is missing."""
+    # Look for specific Turkish headers
+    d_idx = next((i for i, h in enumerate(headers) if 'tarih' in h.lower()), -1)
+    desc_idx = next((i for i, h in enumerate(headers) if 'açıklama' in h.lower()), -1)
+    amt_idx = next((i for i, h in enumerate(headers) if 'tutar' in h.lower()), -1)
+    if d_idx != -1 and desc_idx != -1 and amt_idx != -1:
+        return d_idx, desc_idx, amt_idx
+    return None
+
+
+def statement_row(cells, columns):
+    """Build a transaction dict from cell texts, or None if the row is not a data row."""
+    date_col_idx, desc_col_idx, amount_col_idx = columns
+    if len(cells) <= max(columns):
+        return None
+    # Verify it's a data row by checking if date cell looks like a date
+    try:
+        date_obj = datetime.strptime(cells[date_col_idx], '%d.%m.%Y')
+    except ValueError:
+        return None # Skip header or invalid rows
+    return {
+        'date': date_obj,
+        'description': cells[desc_col_idx],
+        'amount': parse_turkish_amount(cells[amount_col_idx])
+    }
+
+
+class _Cell:
+    __slots__ = ('tag', 'parts')
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.parts = []
+
+    @property
+    def text(self):
+        return ''.join(self.parts)
+
+
+class _Table:
+    __slots__ = ('header_cells', 'rows')
+
+    def __init__(self):
+        self.header_cells = []  # every <th> inside the table, nested ones included
+        self.rows = []          # every <tr> inside the table, as lists of its <td>/<th> cells
+
+    def columns(self):
+        headers = [cell.text for cell in self.header_cells]
+        if not headers and self.rows:
+            # check first row if no th present
+            headers = [cell.text for cell in self.rows[0] if cell.tag == 'td']
+        return find_header_columns(headers)
+
+
+class _Discard:
+    """Stands in for a table, row or cell whose content is no longer needed; whatever is added is dropped."""
+    __slots__ = ()
+
+    def append(self, item):
+        pass
+
+    @property
+    def parts(self):
+        return self
+
+    rows = header_cells = parts
+
+
+_DISCARD = _Discard()
+
+
+class StatementTableParser:
+    """Incremental parser that only keeps the text of table cells.
+
+    It reproduces what the BeautifulSoup logic sees (``find_all`` is recursive,
+    so nested tables' rows and cells count towards their ancestors too) without
+    building a document tree. The statement is the first table in document
+    order whose headers match. As soon as a header row closes and a table
+    matches on its <th> cells, no table can come before it any more (one still
+    open would contain those cells and match first): ``columns`` is set, and
+    each of its rows is appended to ``rows`` once it closes. A row still open
+    holds back the rows opened inside it, unless its date cell already rules it
+    out, so ``rows`` stays in document order. A table matched on a first row of
+    <td> cells could still gain a <th> that changes the match, so that statement
+    is only settled when its outermost table closes. ``finished`` is set when
+    the statement table closes; the rest of the document is ignored.
+
+    Markup is tokenized with a single regex rather than ``html.parser``, which
+    spends most of its time on attribute parsing and line bookkeeping that a
+    statement does not need. Text between tags is unescaped and split at every
+    tag like BeautifulSoup's strings.
+    """
+    TOKEN = re.compile(
+        r'<(?:(/?)([a-zA-Z][^\t\n\r\f />\x00]*)(?:[^>"\']|"[^"]*"|\'[^\']*\')*'
+        r'|!--.*?--|![^>]*|\?[^>]*)>', re.S)
+    RAW_TEXT_END = {'script': re.compile(r'</script\s*>', re.I), 'style': re.compile(r'</style\s*>', re.I)}
+
+    def __init__(self):
+        self.columns = None     # (date, description, amount) indexes, once the statement table is known
+        self.rows = []          # cell texts of the statement rows read and not taken yet
+        self.finished = False   # no more rows will come
+        self._statement = None  # the statement _Table, once known
+        self._stack = []        # open table/tr/td/th elements as (tag, obj)
+        self._tables = []       # tables of the current top-level table, in start order
+        self._headers_changed = False
+        self._text = []
+        self._buffer = ''
+        self._raw_text_end = None  # inside <script>/<style>, whose text get_text() ignores
+
+    def feed(self, data, final=False):
+        buf = self._buffer + data
+        pos = 0
+        end = len(buf)
+        while pos < end and not self.finished:
+            if self._raw_text_end:
+                match = self._raw_text_end.search(buf, pos)
+                if not match:
+                    break
+                self._raw_text_end = None
+                pos = match.end()
+                continue
+
+            lt = buf.find('<', pos)
+            if lt < 0:
+                self._data(buf[pos:])
+                pos = end
+                break
+            if lt > pos:
+                self._data(buf[pos:lt])
+                pos = lt
+
+            match = self.TOKEN.match(buf, pos)
+            if not match:
+                if not final and end - pos < 4096:
+                    break  # possibly a tag split across chunks
+                self._data('<')
+                pos += 1
+                continue
+            pos = match.end()
+            self._flush_text()
+            name = match.group(2)
+            if not name:
+                token = match.group(0)
+                if token.startswith('<![CDATA['):
+                    self._data(token[9:-3] if token.endswith(']]>') else token[9:-1])
+                    self._flush_text()
+                continue
+            tag = name.lower()
+            if match.group(1):
+                self._end(tag)
+            else:
+                self._start(tag)
+                if match.group(0).endswith('/>'):
+                    self._end(tag)
+                elif tag in self.RAW_TEXT_END:
+                    self._raw_text_end = self.RAW_TEXT_END[tag]
+        self._buffer = buf[pos:] if not self.finished else ''
+
+    def close(self):
+        self.feed('', final=True)
+        self._flush_text()
+        if not self.finished and self._tables:
+            # Tables left unclosed at the end of the document
+            self._close_top_level_table()
+        self.finished = True
+
+    def take_rows(self):
+        """Return the statement rows read since the last call, as lists of cell texts."""
+        rows, self.rows = self.rows, []
+        return rows
+
+    def _data(self, text):
+        if self._stack:
+            self._text.append(text)
+
+    def _flush_text(self):
+        if not self._text:
+            return
+        text = ''.join(self._text)
+        self._text = []
+        if '&' in text:
+            text = html.unescape(text)
+        text = text.strip()
+        if text:
+            for tag, obj in self._stack:
+                if tag in ('td', 'th'):
+                    obj.parts.append(text)
+
+    def _start(self, tag):
+        if tag == 'table':
+            # Once the statement is known, other tables' rows and headers are not needed
+            table = _Table() if self._statement is None else _DISCARD
+            if self._statement is None:
+                self._tables.append(table)
+            self._stack.append((tag, table))
+        elif not self._tables:
+            return
+        elif tag == 'tr':
+            row = []
+            for open_tag, obj in self._stack:
+                if open_tag == 'table':
+                    obj.rows.append(row)
+            self._stack.append((tag, row))
+        elif tag in ('td', 'th'):
+            cell = _Cell(tag)
+            for open_tag, obj in self._stack:
+                if open_tag == 'tr':
+                    obj.append(cell)
+                elif open_tag == 'table' and tag == 'th' and self._statement is None:
+                    obj.header_cells.append(cell)
+            self._stack.append((tag, cell))
+
+    def _end(self, tag):
+        if tag not in ('table', 'tr', 'td', 'th'):
+            return
+        # Like BeautifulSoup, close the most recent open element with this name
+        # (and anything left open inside it); stray end tags are ignored.
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][0] == tag:
+                del self._stack[i:]
+                break
+        else:
+            return
+        if tag == 'th':
+            self._headers_changed = True
+        elif tag == 'tr':
+            if self._statement is None and self._headers_changed:
+                self._find_statement()
+            if self._statement is not None:
+                self._take_closed_rows()
+        elif tag == 'table' and not any(t == 'table' for t, _ in self._stack):
+            self._close_top_level_table()
+
+    def _is_open(self, obj):
+        return any(open_obj is obj for _, open_obj in self._stack)
+
+    def _find_statement(self):
+        """Settle on the first matching table if it matches on <th> cells, which no later tag can change."""
+        self._headers_changed = False
+        if any(tag == 'th' for tag, _ in self._stack):
+            return  # The text of an open header cell may still change the match
+        for table in self._tables:
+            columns = table.columns()
+            if not columns:
+                continue
+            if table.header_cells:
+                self.columns = columns
+                self._statement = table
+                self._tables = [table]
+                self._stack = [(tag, _DISCARD if tag == 'table' and obj is not table else obj)
+                               for tag, obj in self._stack]
+            return
+
+    def _take_closed_rows(self):
+        """Move the statement's rows to ``rows`` as they close, in document order."""
+        pending = self._statement.rows
+        taken = 0
+        for row in pending:
+            if self._is_open(row):
+                if not self._ruled_out(row):
+                    break
+                self._discard(row)
+            else:
+                self.rows.append([cell.text for cell in row])
+            taken += 1
+        del pending[:taken]
+
+    def _ruled_out(self, row):
+        """Whether an open row's date cell can already not hold a date, so the row is no transaction."""
+        date_index = self.columns[0]
+        if len(row) <= date_index:
+            return False
+        cell = row[date_index]
+        if self._is_open(cell):
+            # Its text only grows, and a %d.%m.%Y date is at most 10 characters
+            return sum(map(len, cell.parts)) > 10
+        try:
+            datetime.strptime(cell.text, '%d.%m.%Y')
+        except ValueError:
+            return True
+        return False
+
+    def _discard(self, row):
+        """Stop collecting an open row, and the open cells that belong to no later row."""
+        i = next(i for i, (_, obj) in enumerate(self._stack) if obj is row)
+        self._stack[i] = ('tr', _DISCARD)
+        for j in range(i + 1, len(self._stack)):
+            tag, obj = self._stack[j]
+            if tag == 'tr':
+                break
+            if tag in ('td', 'th'):
+                self._stack[j] = (tag, _DISCARD)
+
+    def _close_top_level_table(self):
+        if self._statement is None:
+            for table in self._tables:
+                columns = table.columns()
+                if columns:
+                    self.columns = columns
+                    self._statement = table
+                    break
+        if self._statement is not None:
+            self.rows.extend([cell.text for cell in row] for row in self._statement.rows)
+            self._statement.rows = []
+            self.finished = True
+        self._tables = []
+
+
+def detect_html_encoding(head):
+    """Pick the encoding of an HTML document from its first bytes.
+
+    A BOM wins, then a <meta charset> that ``head`` decodes with, then UTF-8 if
+    ``head`` is valid UTF-8, then windows-1252.
+    """
+    for bom, encoding in ((codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16')):
+        if head.startswith(bom):
+            return encoding
+    candidates = []
+    declared = HTML_META_CHARSET.search(head)
+    if declared:
+        candidates.append(declared.group(1).decode('ascii', 'replace').strip().lower())
+    candidates.append('utf-8')
+    for encoding in candidates:
+        try:
+            # Not final: the chunk may end inside a multi-byte character
+            codecs.getincrementaldecoder(encoding)().decode(head)
+            return encoding
+        except (LookupError, UnicodeDecodeError):
+            continue
+    return 'windows-1252'
+
+
+def parse_html_statement(path):
+    """Stream an HTML statement through StatementTableParser, yielding rows as their ``</tr>`` is read.
+
+    The encoding is sniffed from the first chunk; bytes later in the file that do
+    not decode with it are replaced.
+    """
+    parser = StatementTableParser()
+    with open(path, 'rb') as f:
+        chunk = f.read(HTML_READ_CHUNK_SIZE)
+        decoder = codecs.getincrementaldecoder(detect_html_encoding(chunk))(errors='replace')
+        while True:
+            if chunk:
+                parser.feed(decoder.decode(chunk))
+            else:
+                parser.feed(decoder.decode(b'', final=True))
+                parser.close()
+            for cells in parser.take_rows():
+                tx = statement_row(cells, parser.columns)
+                if tx:
+                    yield tx
+            if parser.finished:
+                break
+            chunk = f.read(HTML_READ_CHUNK_SIZE)
+
+    if parser.columns is None:
+        raise StatementError('Could not find transaction table in HTML.')
+
+
+def parse_html_statement_soup(path):
+    """The original BeautifulSoup implementation, kept as the reference for benchmarks."""
+    from bs4 import BeautifulSoup
+
+    with open(path, 'rb') as f:
+        soup = BeautifulSoup(f, 'html.parser')
+
+    # Find the table with transaction headers
+    tables = soup.find_all('table')
+    target_table = None
+    date_col_idx = -1
+    desc_col_idx = -1
+    amount_col_idx = -1
+
+    for table in tables:
+        headers = [th.get_text(strip=True) for th in table.find_all('th')]
+        if not headers:
+            # check first row if no th present
+            first_row = table.find('tr')
+            if first_row:
+                headers = [td.get_text(strip=True) for td in first_row.find_all('td')]
+
+        # Look for specific Turkish headers
+        d_idx = next((i for i, h in enumerate(headers) if 'tarih' in h.lower()), -1)
+        desc_idx = next((i for i, h in enumerate(headers) if 'açıklama' in h.lower()), -1)
+        amt_idx = next((i for i, h in enumerate(headers) if 'tutar' in h.lower()), -1)
+
+        if d_idx != -1 and desc_idx != -1 and amt_idx != -1:
+            target_table = table
+            date_col_idx = d_idx
+            desc_col_idx = desc_idx
+            amount_col_idx = amt_idx
+            break
+
+    if not target_table:
+        raise StatementError('Could not find transaction table in HTML.')
+
+    # Iterate through rows, skipping header
+    rows = target_table.find_all('tr')
+    for row in rows:
+        cells = row.find_all(['td', 'th'])
+        if len(cells) <= max(date_col_idx, desc_col_idx, amount_col_idx):
+            continue
+
+        # Verify it's a data row by checking if date cell looks like a date
+        date_str = cells[date_col_idx].get_text(strip=True)
+        try:
+            date_obj = datetime.strptime(date_str, '%d.%m.%Y')
+        except ValueError:
+            continue # Skip header or invalid rows
+
+        desc_str = cells[desc_col_idx].get_text(strip=True)
+        amount_str = cells[amount_col_idx].get_text(strip=True)
+
+        yield {
+            'date': date_obj,
+            'description': desc_str,
+            'amount': parse_turkish_amount(amount_str)
+        }
+
+
+def parse_xlsx_statement(path):
+    import openpyxl
+
+    # Read-only mode streams the sheet XML instead of building the whole object model
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from _xlsx_rows(wb.active)
+    finally:
+        wb.close()
+
+
+def _xlsx_rows(ws):
+    rows = ws.iter_rows(values_only=True)
+    headers = list(next(rows, ()))
+
+    date_idx = next((i for i, h in enumerate(headers) if h and 'date' in str(h).lower()), None)
+    desc_idx = next((i for i, h in enumerate(headers) if h and any(k in str(h).lower() for k in ['description', 'memo', 'payee', 'merchant', 'text', 'açıklama'])), None)
+    amount_idx = next((i for i, h in enumerate(headers) if h and any(k in str(h).lower() for k in ['amount', 'betrag', 'value', 'price', 'tutar'])), None)
+
+    if date_idx is None or desc_idx is None or amount_idx is None:
+        raise StatementError('Could not identify strict columns (Date, Description, Amount). Headers found: ' + str(headers))
+
+    width = max(date_idx, desc_idx, amount_idx) + 1
+    for row in rows:
+        if len(row) < width:
+            # Sheets without a dimension record yield ragged rows
+            row = tuple(row) + (None,) * (width - len(row))
+        if not row[date_idx] or row[amount_idx] is None: continue
+
+        date_val = row[date_idx]
+        date_obj = datetime.utcnow()
+
+        if isinstance(date_val, str):
+            try:
+                date_obj = datetime.strptime(date_val, '%Y-%m-%d')
+            except:
+                try:
+                    date_obj = datetime.strptime(date_val, '%d.%m.%Y')
+                except:
+                    continue
+        elif isinstance(date_val, datetime):
+            date_obj = date_val
+        else:
+            continue
+
+        desc_val = str(row[desc_idx]).strip()
+        amount_val = row[amount_idx]
+
+        if isinstance(amount_val, str):
+            try:
+                amount_val = float(re.sub(r'[^\d.-]', '', amount_val.replace(',', '.')))
+            except:
+                if ',' in amount_val and '.' in amount_val: # European/Turkish format using helper
+                    amount_val = parse_turkish_amount(str(row[amount_idx]))
+                else:
+                    continue
+
+        yield {
+            'date': date_obj,
+            'description': desc_val,
+            'amount': float(amount_val)
+        }
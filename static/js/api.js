@@ -1,9 +1,27 @@
-export async function fetchDashboardData() {
-    const response = await fetch('/api/dashboard');
+// Last body and ETag of each conditional GET, reused when the server answers 304 Not Modified
+const validatedResponses = new Map();
+
+async function fetchIfModified(url, errorMessage) {
+    const cached = validatedResponses.get(url);
+    const response = await fetch(url, {
+        headers: cached ? { 'If-None-Match': cached.etag } : {},
+    });
+    if (response.status === 304 && cached) {
+        return JSON.parse(cached.body);
+    }
     if (!response.ok) {
-        throw new Error('Failed to fetch dashboard data');
+        throw new Error(errorMessage);
     }
-    return response.json();
+    const body = await response.text();
+    const etag = response.headers.get('ETag');
+    if (etag) {
+        validatedResponses.set(url, { etag, body });
+    }
+    return JSON.parse(body);
+}
+
+export async function fetchDashboardData() {
+    return fetchIfModified('/api/dashboard', 'Failed to fetch dashboard data');
 }
 
 export async function addAccount(name, type, balance) {
@@ -49,11 +67,7 @@ export async function deleteTransaction(transactionId) {
 }
 
 export async function fetchCategories() {
-    const response = await fetch('/api/categories');
-    if (!response.ok) {
-        throw new Error('Failed to fetch categories');
-    }
-    return response.json();
+    return fetchIfModified('/api/categories', 'Failed to fetch categories');
 }
 
 export async function addCategory(name, type) {
@@ -86,9 +100,7 @@ export async function updateSettings(settings) {
 }
 
 export async function fetchRecurring() {
-    const response = await fetch('/api/recurring');
-    if (!response.ok) throw new Error('Failed to fetch recurring transactions');
-    return response.json();
+    return fetchIfModified('/api/recurring', 'Failed to fetch recurring transactions');
 }
 
 export async function addRecurring(data) {
@@ -128,4 +140,14 @@ export async function uploadTransactions(file, accountId, useAi) {
         body: formData,
     });
     return response.json();
-}
\ No newline at end of file
+}
+
+export async function getImportJob(jobId) {
+    const response = await fetch(`/api/upload/${jobId}`);
+    return response.json();
+}
+
+export async function cancelImportJob(jobId) {
+    const response = await fetch(`/api/upload/${jobId}/cancel`, { method: 'POST' });
+    return response.json();
+}
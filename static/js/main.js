@@ -69,6 +69,7 @@ document.addEventListener('DOMContentLoaded', () => {
         importFileInput: document.getElementById('import-file-input'),
         importSubmitBtn: document.getElementById('import-submit-btn'),
         importStatus: document.getElementById('import-status'),
+        importCancelBtn: document.getElementById('import-cancel-btn'),
         useAiCategorization: document.getElementById('use-ai-categorization'),
 
         errorToast: document.getElementById('error-toast'),
@@ -777,6 +778,29 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
+    let activeImportJobId = null;
+
+    const showImportError = (message) => {
+        ui.showErrorToast(message);
+        elements.importStatus.textContent = 'Error: ' + message;
+        elements.importStatus.style.color = 'var(--destructive)';
+    };
+
+    const waitForImportJob = async (job) => {
+        while (job.state === 'queued' || job.state === 'running') {
+            if (job.cancel_requested) {
+                elements.importStatus.textContent = 'Cancelling...';
+            } else if (job.state === 'queued') {
+                elements.importStatus.textContent = 'Waiting for the import to start...';
+            } else {
+                elements.importStatus.textContent = `Processing... ${job.rows_processed} rows read, ${job.inserted} imported.`;
+            }
+            await new Promise(resolve => setTimeout(resolve, 1000));
+            job = await api.getImportJob(job.id);
+        }
+        return job;
+    };
+
     if (elements.importSubmitBtn) {
         elements.importSubmitBtn.addEventListener('click', async () => {
              const accountId = elements.importAccountSelect.value;
@@ -789,17 +813,26 @@ document.addEventListener('DOMContentLoaded', () => {
 
              elements.importSubmitBtn.disabled = true;
              elements.importSubmitBtn.textContent = 'Importing...';
-             elements.importStatus.textContent = 'Uploading and processing... This may take a moment.';
+             elements.importStatus.textContent = 'Uploading...';
              elements.importStatus.style.color = 'var(--text-primary)';
 
              try {
                  const result = await api.uploadTransactions(file, accountId, useAi);
                  if (result.error) {
-                     ui.showErrorToast(result.error);
-                     elements.importStatus.textContent = 'Error: ' + result.error;
-                     elements.importStatus.style.color = 'var(--destructive)';
+                     return showImportError(result.error);
+                 }
+
+                 activeImportJobId = result.job.id;
+                 elements.importCancelBtn.style.display = 'block';
+                 const job = await waitForImportJob(result.job);
+
+                 if (job.state === 'failed') {
+                     showImportError(job.error);
                  } else {
-                     ui.showErrorToast(`Successfully imported ${result.count} transactions.`);
+                     const message = job.state === 'cancelled'
+                         ? `Import cancelled after ${job.inserted} transactions.`
+                         : `Successfully imported ${job.inserted} transactions.`;
+                     ui.showErrorToast(message);
                      ui.closeModal(elements.importModal);
                      if (onDetailsPage) {
                         window.location.reload();
@@ -813,12 +846,24 @@ document.addEventListener('DOMContentLoaded', () => {
                  elements.importStatus.textContent = 'An unexpected error occurred.';
                  elements.importStatus.style.color = 'var(--destructive)';
              } finally {
+                 activeImportJobId = null;
+                 elements.importCancelBtn.style.display = 'none';
+                 elements.importCancelBtn.disabled = false;
                  elements.importSubmitBtn.disabled = false;
                  elements.importSubmitBtn.textContent = 'Import Data';
              }
         });
     }
 
+    if (elements.importCancelBtn) {
+        elements.importCancelBtn.addEventListener('click', async () => {
+            if (!activeImportJobId) return;
+            elements.importCancelBtn.disabled = true;
+            elements.importStatus.textContent = 'Cancelling...';
+            await api.cancelImportJob(activeImportJobId);
+        });
+    }
+
     window.addEventListener('keydown', (e) => {
         if (e.key === 'Escape') {
             document.querySelectorAll('.modal.visible').forEach(ui.closeModal);
@@ -0,0 +1,113 @@
+"""Fixtures: the app on a scratch database and a fresh logged-in user per test.
+
+Every test runs against a migrated SQLite file in a temporary directory. Set
+TEST_DATABASE_URL to a PostgreSQL database as well (for example
+``postgresql+psycopg://localhost/easy_finance_test``) to run them a second time
+there. That database is wiped first, so never point it at real data.
+"""
+import os
+import time
+import uuid
+from types import SimpleNamespace
+
+import pytest
+import sqlalchemy as sa
+
+import app as easy_finance
+import commands
+import migrations
+from app import db
+
+BACKENDS = ['sqlite'] + (['postgresql'] if os.environ.get('TEST_DATABASE_URL') else [])
+
+
+def wipe(url):
+    """Drop every table (and the search index with them) of the database at ``url``."""
+    engine = sa.create_engine(url)
+    metadata = sa.MetaData()
+    with engine.begin() as conn:
+        metadata.reflect(conn)
+        metadata.drop_all(conn)
+    engine.dispose()
+
+
+@pytest.fixture(scope='session', params=BACKENDS)
+def app(request, tmp_path_factory):
+    if request.param == 'sqlite':
+        url = f"sqlite:///{tmp_path_factory.mktemp('db') / 'test.db'}"
+    else:
+        url = easy_finance.database_url(os.environ['TEST_DATABASE_URL'])
+        wipe(url)
+    application = easy_finance.create_app({
+        'SQLALCHEMY_DATABASE_URI': url, 'SECRET_KEY': 'test', 'TESTING': True,
+        'ASSETS_BUILD': False, 'RECURRING_SCHEDULER': 'off',
+    })
+    with application.app_context():
+        migrations.upgrade(db.engine, db.metadata)
+    yield application
+    with application.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def user_id(app):
+    with app.app_context():
+        user = easy_finance.User(username=f'test-{uuid.uuid4().hex[:8]}')
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+@pytest.fixture
+def client(app, user_id):
+    return commands.logged_in_client(app, user_id)
+
+
+@pytest.fixture
+def ledger(client):
+    """Accounts Main (opened with 1000) and Other, a Food & drinks category and six transactions of Main.
+
+    Every other transaction is in Food & drinks. ``ids`` are the transactions in the order created.
+    """
+    main_id = client.post('/api/accounts', json={'name': 'Main', 'balance': 1000.0}).get_json()['id']
+    other_id = client.post('/api/accounts', json={'name': 'Other', 'balance': 0.0}).get_json()['id']
+    food_id = client.post('/api/categories', json={'name': 'Food & drinks', 'type': 'expense'}).get_json()['id']
+    ids = []
+    for i, (description, amount) in enumerate([('Coffee', -3.5), ('Salary', 2500.0), ('50% off_sale', -20.0),
+                                               ('Rent', -900.0), ('Refund', 12.25), ('Groceries', -64.1)]):
+        response = client.post('/api/transactions', json={'account_id': main_id, 'description': description,
+                                                          'amount': amount, 'category_id': food_id if i % 2 else None})
+        assert response.status_code == 201
+        ids.append(response.get_json()['id'])
+    return SimpleNamespace(main_id=main_id, other_id=other_id, food_id=food_id, ids=ids)
+
+
+@pytest.fixture
+def upload(client):
+    """Upload a statement file to an account and wait for its import job to finish; returns the job."""
+    def run(account_id, path, filename='statement.html'):
+        with open(path, 'rb') as f:
+            response = client.post('/api/upload', data={'account_id': str(account_id), 'file': (f, filename)})
+        assert response.status_code == 202, response.get_json()
+        job = response.get_json()['job']
+        deadline = time.monotonic() + 60
+        while job['state'] in easy_finance.ImportJob.ACTIVE_STATES:
+            assert time.monotonic() < deadline, 'the import did not finish'
+            time.sleep(0.05)
+            job = client.get(f"/api/upload/{job['id']}").get_json()
+        return job
+    return run
+
+
+@pytest.fixture
+def assert_consistent(app):
+    """Check that accounts' balances and rollups add up to their transactions, given their opening balances."""
+    def check(openings):
+        with app.app_context():
+            for account_id, opening in openings.items():
+                drift = commands.account_drift(account_id, opening)
+                assert abs(drift['balance']) < 1e-6, drift
+                assert abs(drift['rollup_total']) < 1e-6, drift
+                assert drift['rollup_count'] == 0, drift
+    return check
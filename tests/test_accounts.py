@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta
+
+import benchmarks
+from app import MonthlyRollup, RecurringTransaction, Transaction
+
+
+def test_dashboard(client, ledger):
+    dashboard = client.get('/api/dashboard').get_json()
+    assert [account['name'] for account in sorted(dashboard['accounts'], key=lambda a: a['name'])] == ['Main', 'Other']
+
+
+def test_settings(client):
+    assert client.put('/api/settings', json={'currency': '€'}).status_code == 200
+    assert client.get('/api/settings').get_json()['currency'] == '€'
+
+
+def test_settings_changed_by_another_worker(client):
+    assert client.put('/api/settings', json={'currency': '€'}).status_code == 200
+    assert client.get('/api/settings').get_json()['currency'] == '€'
+    # A forked process has its own copy of the user cache, as a second gunicorn worker does
+    [status] = benchmarks.run_forked([(lambda: client.put('/api/settings', json={'currency': '£'}).status_code, ())])
+    assert status == 200
+    assert client.get('/api/settings').get_json()['currency'] == '£'
+
+
+def test_delete_category_in_use(client, ledger, assert_consistent):
+    assert client.delete(f'/api/categories/{ledger.food_id}').status_code == 200
+    assert [category['id'] for category in client.get('/api/categories').get_json()] == []
+    assert_consistent({ledger.main_id: 1000.0})
+
+
+def test_delete_account(app, client, ledger):
+    start = (datetime.utcnow() - timedelta(days=2)).strftime('%Y-%m-%dT00:00:00')
+    client.post('/api/recurring', json={'name': 'Gym', 'amount': -2.0, 'frequency': 'daily', 'start_date': start,
+                                        'account_id': ledger.main_id})
+    assert client.delete(f'/api/accounts/{ledger.main_id}').status_code == 200
+    with app.app_context():
+        assert Transaction.query.filter_by(account_id=ledger.main_id).count() == 0
+        assert MonthlyRollup.query.filter_by(account_id=ledger.main_id).count() == 0
+        assert RecurringTransaction.query.filter_by(account_id=ledger.main_id).count() == 0
+    assert [account['id'] for account in client.get('/api/dashboard').get_json()['accounts']] == [ledger.other_id]
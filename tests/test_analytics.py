@@ -0,0 +1,56 @@
+import pytest
+
+import analytics
+import benchmarks
+from app import analytics_by_sql, parse_day
+
+
+@pytest.fixture
+def history(ledger, upload, tmp_path):
+    """The ledger plus a 300-row statement from 2015 and 2016 in Other."""
+    path = tmp_path / 'statement.html'
+    benchmarks.write_html_statement(path, 300)
+    assert upload(ledger.other_id, path)['state'] == 'succeeded'
+    return ledger
+
+
+def matches_sql(app, client, user_id, params):
+    response = client.get('/api/analytics', query_string=params)
+    assert response.status_code == 200
+    body = response.get_json()
+    with app.app_context():
+        periods, groups = analytics_by_sql(user_id, parse_day(body['start_date']), parse_day(body['end_date']),
+                                           body['granularity'], body['group_by'], body['account_id'])
+    return benchmarks.analytics_agree(body, periods, groups)
+
+
+@pytest.mark.parametrize('granularity', analytics.GRANULARITIES)
+@pytest.mark.parametrize('group_by', analytics.GROUP_BYS)
+def test_analytics_match_sql(app, client, user_id, history, granularity, group_by):
+    params = {'granularity': granularity, 'group_by': group_by}
+    if granularity == 'day':
+        params.update(start_date='2015-01-01', end_date='2016-06-30')
+    assert matches_sql(app, client, user_id, params)
+
+
+def test_analytics_of_one_account(app, client, user_id, history):
+    assert matches_sql(app, client, user_id, {'granularity': 'week', 'group_by': 'category', 'account_id': history.other_id})
+
+
+def test_analytics_see_new_transactions(client, history):
+    total = lambda: sum(series['total'] for series in
+                        client.get('/api/analytics', query_string={'group_by': 'account'}).get_json()['series'])
+    before = total()
+    client.post('/api/transactions', json={'account_id': history.main_id, 'description': 'Late', 'amount': 1.25})
+    assert total() - before == pytest.approx(1.25)
+
+
+@pytest.mark.parametrize('params, status', [
+    ({'granularity': 'hour'}, 400),
+    ({'group_by': 'merchant'}, 400),
+    ({'start_date': '2015-01-01', 'granularity': 'day'}, 400),  # Too many periods
+    ({'start_date': '2020-02-30'}, 400),
+    ({'account_id': -1}, 404),
+])
+def test_analytics_reject_bad_arguments(client, history, params, status):
+    assert client.get('/api/analytics', query_string=params).status_code == status
@@ -0,0 +1,22 @@
+import app as easy_finance
+import migrations
+from app import db
+
+
+def test_apps_keep_their_own_state(app, client, tmp_path):
+    # The session's app has remembered that its database is set up and current
+    assert client.get('/api/categories').status_code == 200
+    other = easy_finance.create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'other.db'}",
+                                     'SECRET_KEY': 'test', 'TESTING': True, 'ASSETS_BUILD': False,
+                                     'RECURRING_SCHEDULER': 'off'})
+    with other.app_context():
+        migrations.upgrade(db.engine, db.metadata)
+    try:
+        response = other.test_client().get('/api/categories')
+        assert response.status_code == 302 and response.location.endswith('/setup')
+        with other.app_context():
+            easy_finance.forget_process_caches()
+        assert app.extensions['easy_finance'].setup_complete
+    finally:
+        with other.app_context():
+            db.engine.dispose()
@@ -0,0 +1,51 @@
+"""Several processes writing to one database at once, as gunicorn workers do next to import jobs and the scheduler."""
+from datetime import datetime, timedelta
+
+import app as easy_finance
+import benchmarks
+import commands
+from app import ImportJob, RecurringTransaction, Transaction, db
+
+WRITERS = 4
+OPERATIONS = 150
+IMPORT_ROWS = 3000
+
+
+def test_writers_lose_no_updates(app, user_id, ledger, assert_consistent):
+    results = benchmarks.run_forked([
+        (lambda seed: benchmarks.random_writes(commands.logged_in_client(app, user_id), ledger.main_id,
+                                               OPERATIONS, seed), (seed,))
+        for seed in range(WRITERS)])
+    assert [r.get('failed') for r in results] == [0] * WRITERS, results
+    assert_consistent({ledger.main_id: 1000.0})
+
+
+def test_import_and_scheduler_alongside_writers(app, user_id, ledger, tmp_path, assert_consistent):
+    path = tmp_path / 'statement.html'
+    benchmarks.write_html_statement(path, IMPORT_ROWS)
+    start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=59)
+    with app.app_context():
+        db.session.add(RecurringTransaction(name='Gym', amount=-2.0, frequency='daily', start_date=start,
+                                            next_due_date=start, account_id=ledger.other_id, user_id=user_id))
+        job = ImportJob(user_id=user_id, account_id=ledger.other_id, filename='statement.html', path=str(path),
+                        use_ai=False)
+        db.session.add(job)
+        db.session.commit()
+        job_id = job.id
+
+    def tick():
+        with app.app_context():
+            return {'posted': easy_finance.recurring_tick()}
+
+    writers = [(lambda seed: benchmarks.random_writes(commands.logged_in_client(app, user_id), ledger.main_id,
+                                                      OPERATIONS, seed), (seed,))
+               for seed in range(WRITERS)]
+    results = benchmarks.run_forked([(easy_finance.run_import_job, (app, job_id)), (tick, ())] + writers)
+    assert [r.get('failed') for r in results[2:]] == [0] * WRITERS, results
+    assert results[1] == {'posted': 60}, results
+
+    with app.app_context():
+        job = db.session.get(ImportJob, job_id)
+        assert (job.state, job.inserted, job.error) == ('succeeded', IMPORT_ROWS, None)
+        assert Transaction.query.filter_by(account_id=ledger.other_id).count() == IMPORT_ROWS + 60
+    assert_consistent({ledger.main_id: 1000.0, ledger.other_id: 0.0})
@@ -0,0 +1,59 @@
+import io
+import re
+import zipfile
+import xml.etree.ElementTree as ElementTree
+from datetime import datetime
+
+import pytest
+
+import benchmarks
+import exports
+
+COLUMNS = [('Date', 12), ('Description', 48), ('Amount', 14)]
+ROWS = [
+    [datetime(2024, 2, 29, 13, 45), 'Coffee & cake <to go>', -3.5],
+    [datetime(1999, 12, 31), '=HYPERLINK("x")', 1e-7],
+    [datetime(2024, 1, 1), 'Bell\x07 and tab\t', 1234567.891],
+    [None, None, None],
+    [datetime(2024, 1, 2), 'Overflow', float('inf')],
+    [datetime(2024, 1, 3), 'Underflow', float('-inf')],
+    [datetime(2024, 1, 4), 'Not a number', float('nan')],
+]
+
+
+def xlsx(batches):
+    return b''.join(exports.xlsx_chunks(COLUMNS, batches))
+
+
+def test_xlsx_package_is_well_formed():
+    with zipfile.ZipFile(io.BytesIO(xlsx([ROWS[:2], [], ROWS[2:]]))) as package:
+        assert package.testzip() is None
+        for name in package.namelist():
+            ElementTree.fromstring(package.read(name))
+        sheet = ElementTree.fromstring(package.read('xl/worksheets/sheet1.xml'))
+    ns = {'s': exports.SPREADSHEET_NS}
+    assert [row.get('r') for row in sheet.iterfind('.//s:row', ns)] == [str(n) for n in range(1, len(ROWS) + 2)]
+    # Plain decimal numbers only: Excel reports a workbook with inf or nan in a <v> as corrupt
+    assert all(re.fullmatch(r'-?\d+(\.\d*)?(e[+-]?\d+)?', value.text) for value in sheet.iterfind('.//s:v', ns))
+
+
+def test_xlsx_cells():
+    header, *rows = benchmarks.read_export('xlsx', xlsx([ROWS]))
+    assert header == [name for name, width in COLUMNS]
+    assert rows == [
+        ['2024-02-29', 'Coffee & cake <to go>', -3.5],
+        ['1999-12-31', '=HYPERLINK("x")', 1e-7],
+        ['2024-01-01', 'Bell and tab\t', 1234567.891],
+        [None, None, None],
+        ['2024-01-02', 'Overflow', 'inf'],
+        ['2024-01-03', 'Underflow', '-inf'],
+        ['2024-01-04', 'Not a number', 'nan'],
+    ]
+
+
+@pytest.mark.parametrize('file_format', exports.FORMATS)
+def test_one_chunk_per_batch(file_format):
+    writer, mimetype = exports.FORMATS[file_format]
+    chunks = list(writer(COLUMNS, iter([ROWS[:1], ROWS[1:2], ROWS[2:3]])))
+    # The header with the first batch, one per later batch, and the end of the file
+    assert len(chunks) == 4
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+import app as easy_finance
+import benchmarks
+from app import ImportJob, Transaction, db
+
+
+def test_statement_import(app, client, ledger, upload, tmp_path, assert_consistent):
+    path = tmp_path / 'statement.html'
+    benchmarks.write_html_statement(path, 300)
+    job = upload(ledger.other_id, path)
+    assert (job['state'], job['inserted'], job['duplicates']) == ('succeeded', 300, 0)
+    with app.app_context():
+        assert db.session.query(Transaction).filter_by(account_id=ledger.other_id).count() == 300
+    assert_consistent({ledger.other_id: 0.0})
+
+    # Importing the same statement again only finds duplicates
+    job = upload(ledger.other_id, path)
+    assert (job['state'], job['inserted'], job['duplicates']) == ('succeeded', 0, 300)
+
+
+def test_unsupported_upload(client, ledger, tmp_path):
+    path = tmp_path / 'statement.pdf'
+    path.write_bytes(b'%PDF-1.4')
+    with open(path, 'rb') as f:
+        response = client.post('/api/upload', data={'account_id': str(ledger.main_id), 'file': (f, 'statement.pdf')})
+    assert response.status_code == 400
+
+
+def add_job(app, user_id, account_id, path, **values):
+    with app.app_context():
+        job = ImportJob(user_id=user_id, account_id=account_id, filename='statement.html', path=str(path), **values)
+        db.session.add(job)
+        db.session.commit()
+        return job.id
+
+
+def test_job_failed_by_a_poll_stops(app, client, ledger, user_id, tmp_path, monkeypatch):
+    path = tmp_path / 'statement.html'
+    benchmarks.write_html_statement(path, 300)
+    job_id = add_job(app, user_id, ledger.other_id, path, use_ai=True)
+
+    class SlowClient:
+        def categorize(self, descriptions, categories, timeout):
+            # Answers so slow that a poll takes the job for lost
+            with app.app_context():
+                db.session.execute(db.update(ImportJob).where(ImportJob.id == job_id)
+                                   .values(updated_at=datetime.utcnow() - timedelta(hours=1)))
+                db.session.commit()
+            assert client.get(f'/api/upload/{job_id}').get_json()['state'] == 'failed'
+            return {}
+    monkeypatch.setitem(app.config, 'AI_CLIENT_FACTORY', lambda user: SlowClient())
+
+    easy_finance.run_import_job(app, job_id)
+    job = client.get(f'/api/upload/{job_id}').get_json()
+    assert (job['state'], job['inserted']) == ('failed', 0)
+    with app.app_context():
+        assert db.session.query(Transaction).filter_by(account_id=ledger.other_id).count() == 0
+
+
+def test_polls_leave_queued_jobs_alone(app, client, ledger, user_id, tmp_path):
+    an_hour_ago = datetime.utcnow() - timedelta(hours=1)
+    queued = add_job(app, user_id, ledger.other_id, tmp_path / 'queued.html', created_at=an_hour_ago,
+                     updated_at=an_hour_ago)
+    running = add_job(app, user_id, ledger.other_id, tmp_path / 'running.html', state='running',
+                      updated_at=an_hour_ago)
+    assert client.get(f'/api/upload/{queued}').get_json()['state'] == 'queued'
+    assert client.get(f'/api/upload/{running}').get_json()['state'] == 'failed'
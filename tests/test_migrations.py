@@ -0,0 +1,98 @@
+"""Upgrading scratch SQLite databases step by step, as existing installations are."""
+from datetime import datetime
+
+import pytest
+import sqlalchemy as sa
+
+import migrations
+import rollups
+from app import db
+
+tables = db.metadata.tables
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'upgrade.db'}")
+    yield engine
+    engine.dispose()
+
+
+def add_account(conn):
+    user_id = conn.execute(tables['user'].insert().values(username='upgrade', password_hash='x')).inserted_primary_key[0]
+    return user_id, conn.execute(tables['account'].insert().values(name='Main', user_id=user_id)).inserted_primary_key[0]
+
+
+def buckets(conn):
+    rollup = tables['monthly_rollup']
+    return conn.execute(sa.select(rollup.c.category_id, rollup.c.year, rollup.c.month, rollup.c.count, rollup.c.expense)
+                        .order_by(rollup.c.id)).all()
+
+
+def schema(engine):
+    """Columns (with their nullability) and indexes of the models' tables."""
+    inspector = sa.inspect(engine)
+    with engine.connect() as conn:
+        # Reflection leaves out expression indexes
+        indexes = conn.execute(sa.text("SELECT tbl_name, name FROM sqlite_master WHERE type = 'index'")).all()
+    return {name: ({(column['name'], column['nullable']) for column in inspector.get_columns(name)},
+                   {index for table, index in indexes if table == name})
+            for name in tables}
+
+
+def test_upgrade_builds_the_models_schema(engine, tmp_path):
+    migrations.upgrade(engine, db.metadata)
+    models = sa.create_engine(f"sqlite:///{tmp_path / 'models.db'}")
+    db.metadata.create_all(models)
+    assert schema(engine) == schema(models)
+    models.dispose()
+
+
+def test_first_step_creates_the_original_tables(engine):
+    migrations.upgrade(engine, db.metadata, target=1)
+    columns = {name: {column['name'] for column in sa.inspect(engine).get_columns(name)}
+               for name in ('user', 'recurring_transaction')}
+    assert 'gemini_api_key' not in columns['user']
+    assert not {'payment_type', 'total_amount', 'paid_amount'} & columns['recurring_transaction']
+    assert set(sa.inspect(engine).get_table_names()) == {'schema_version', 'user', 'account', 'category',
+                                                         'transaction', 'recurring_transaction'}
+
+
+def test_rollup_buckets_become_unique(engine):
+    migrations.upgrade(engine, db.metadata, target=11)
+    with engine.begin() as conn:
+        # Created along with the table now, but not in databases migrated before it existed
+        conn.execute(sa.text('DROP INDEX ix_rollup_bucket'))
+        user_id, account_id = add_account(conn)
+        for amount in (-1.0, -2.0):
+            conn.execute(tables['transaction'].insert().values(
+                description='Coffee', amount=amount, date=datetime(2024, 1, 5), account_id=account_id))
+        # What two writers inserting the same new bucket at once could leave behind
+        for amount in (-1.0, -2.0):
+            conn.execute(tables['monthly_rollup'].insert().values(
+                user_id=user_id, account_id=account_id, category_id=None, year=2024, month=1, expense=amount, count=1))
+
+    migrations.upgrade(engine, db.metadata)
+    with engine.begin() as conn:
+        assert buckets(conn) == [(None, 2024, 1, 2, -3.0)]
+        with pytest.raises(sa.exc.IntegrityError):
+            conn.execute(tables['monthly_rollup'].insert().values(
+                user_id=user_id, account_id=account_id, category_id=None, year=2024, month=1, count=1))
+
+
+def test_rollup_deltas_add_up_in_one_row_per_bucket(engine):
+    migrations.upgrade(engine, db.metadata)
+    with engine.begin() as conn:
+        user_id, account_id = add_account(conn)
+        category_id = conn.execute(tables['category'].insert().values(
+            name='Food', type='expense', user_id=user_id)).inserted_primary_key[0]
+        for category in (None, category_id, None):
+            deltas = rollups.RollupDeltas()
+            deltas.add(account_id, category, datetime(2024, 1, 5), -2.5)
+            deltas.apply(conn, db.metadata, user_id)
+        assert buckets(conn) == [(None, 2024, 1, 2, -5.0), (category_id, 2024, 1, 1, -2.5)]
+
+        deltas = rollups.RollupDeltas()
+        deltas.remove(account_id, category_id, datetime(2024, 1, 5), -2.5)
+        deltas.apply(conn, db.metadata, user_id)
+        assert buckets(conn) == [(None, 2024, 1, 2, -5.0)]
@@ -0,0 +1,65 @@
+"""The hot paths must be answered from indexes: with EXPLAIN_QUERY_PLANS on, a full table scan raises QueryPlanError."""
+from datetime import datetime
+
+import pytest
+
+from app import Category, CategoryCache, RecurringTransaction, Transaction, db, find_table_scans
+
+XHR = {'X-Requested-With': 'XMLHttpRequest'}
+
+
+@pytest.fixture
+def explained(app, monkeypatch):
+    if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        pytest.skip('Query plan checks are only supported on SQLite')
+    monkeypatch.setitem(app.config, 'EXPLAIN_QUERY_PLANS', True)
+    return app
+
+
+@pytest.mark.parametrize('url, headers', [
+    ('/api/dashboard', {}),
+    ('/api/categories', {}),
+    ('/api/recurring', {}),
+    ('/api/forecast', {}),
+    ('/api/analytics', {}),
+    ('/account/{account}', {}),
+    ('/account/{account}?search=a', XHR),
+    ('/account/{account}?type=expense', XHR),
+    ('/account/{account}?start_date=2000-01-01&end_date=2100-01-01', XHR),
+    ('/account/{account}?min_amount=1&max_amount=1000', XHR),
+    ('/api/accounts/{account}/transactions', {}),
+    ('/api/transactions/search?search=mig%20tic&min_amount=10', {}),
+    ('/api/export?format=csv&account_id={account}&type=expense', {}),
+])
+def test_endpoint_uses_indexes(explained, client, ledger, url, headers):
+    assert client.get(url.format(account=ledger.main_id), headers=headers).status_code == 200
+
+
+def test_import_lookups_use_indexes(explained, ledger, user_id):
+    # The duplicate check and category/cache lookups of import_statement
+    with explained.app_context():
+        db.session.scalars(db.select(Transaction.fingerprint)
+                           .where(Transaction.account_id == ledger.main_id, Transaction.fingerprint.in_(['0' * 40]))).all()
+        Category.query.filter_by(user_id=user_id).order_by(Category.id).all()
+        db.session.execute(db.select(CategoryCache.description_key, CategoryCache.category_name)
+                           .where(CategoryCache.user_id == user_id, CategoryCache.description_key.in_(['x']))).all()
+
+
+def test_scheduler_lookup_uses_indexes(explained):
+    with explained.app_context():
+        RecurringTransaction.query.filter(RecurringTransaction.is_active == True,
+                                          RecurringTransaction.next_due_date < datetime.utcnow()).all()
+
+
+@pytest.mark.parametrize('detail, statement, scanned', [
+    ('SCAN transaction', 'SELECT * FROM "transaction"', True),
+    ('SCAN transaction USING COVERING INDEX ix_transaction_account_date', 'SELECT id FROM "transaction"', True),
+    ('SCAN transaction_1 USING INDEX ix_transaction_account_date',
+     'SELECT 1 FROM account JOIN "transaction" AS transaction_1 ON account.id = transaction_1.account_id', True),
+    ('SEARCH transaction USING INDEX ix_transaction_account_date (account_id=?)', 'SELECT * FROM "transaction"', False),
+    ('SCAN user USING COVERING INDEX sqlite_autoindex_user_1', 'SELECT id FROM user', False),
+    ('SCAN anon_1', 'SELECT * FROM (SELECT 1) AS anon_1', False),
+    ('SCAN transaction_search VIRTUAL TABLE INDEX 0:M1', 'SELECT rowid FROM transaction_search', False),
+])
+def test_find_table_scans(detail, statement, scanned):
+    assert find_table_scans([detail], {'user'}, statement) == ([detail] if scanned else [])
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+from dateutil.relativedelta import relativedelta
+
+import benchmarks
+from app import Account, RecurringTransaction, Transaction, db, parse_day, process_recurring_transactions
+
+
+def test_due_occurrences_are_posted_once(app, client, ledger, user_id, assert_consistent):
+    start = (datetime.utcnow() - timedelta(days=9)).strftime('%Y-%m-%dT00:00:00')
+    client.post('/api/recurring', json={'name': 'Gym', 'amount': -2.0, 'frequency': 'daily', 'start_date': start,
+                                        'account_id': ledger.other_id, 'category_id': ledger.food_id})
+    client.post('/api/recurring', json={'name': 'Loan', 'amount': 30.0, 'frequency': 'weekly', 'start_date': start,
+                                        'account_id': ledger.other_id, 'payment_type': 'debt', 'total_amount': 45.0})
+    with app.app_context():
+        for rule in RecurringTransaction.query.filter_by(user_id=user_id):
+            rule.next_due_date = rule.start_date
+        db.session.commit()
+        process_recurring_transactions()
+        process_recurring_transactions()
+        # Ten days of Gym; the debt is paid off in two payments, the second capped at what remained
+        amounts = sorted(amount for amount, in db.session.query(Transaction.amount).filter_by(account_id=ledger.other_id))
+        assert amounts == [-30.0, -15.0] + [-2.0] * 10
+
+    rules = client.get('/api/recurring').get_json()
+    assert len(rules) == 2
+    assert next(rule for rule in rules if rule['name'] == 'Loan')['is_active'] is False
+    assert_consistent({ledger.other_id: 0.0})
+
+
+def add_forecast_rules(client, ledger, next_month):
+    for rule in ({'name': 'Rent', 'amount': -700.0, 'frequency': 'monthly', 'start_date': '2024-01-31T00:00:00',
+                  'end_date': (next_month + relativedelta(months=14)).isoformat(), 'account_id': ledger.main_id},
+                 {'name': 'Bonus', 'amount': 1500.0, 'frequency': 'yearly', 'start_date': '2020-03-15T00:00:00',
+                  'account_id': ledger.main_id},
+                 {'name': 'Car loan', 'amount': -100.0, 'frequency': 'monthly', 'start_date': next_month.isoformat(),
+                  'account_id': ledger.other_id, 'payment_type': 'debt', 'total_amount': 1000.0, 'paid_amount': 150.0}):
+        assert client.post('/api/recurring', json=rule).status_code == 201
+
+
+def test_forecast_matches_posting_each_occurrence(app, client, ledger, user_id):
+    next_month = datetime.utcnow().date().replace(day=1) + relativedelta(months=1)
+    add_forecast_rules(client, ledger, next_month)
+    projected = client.get('/api/forecast', query_string={'months': 24}).get_json()
+    with app.app_context():
+        expected = benchmarks.forecast_by_occurrences(
+            RecurringTransaction.query.filter_by(user_id=user_id).all(),
+            {account.id: account.balance for account in Account.query.filter_by(user_id=user_id).order_by(Account.name)},
+            parse_day(projected['start_date']), parse_day(projected['end_date']))
+    assert [account['id'] for account in projected['accounts']] == list(expected)
+    for account in projected['accounts']:
+        assert len(account['balances']) == len(projected['dates'])
+        assert max(abs(a - b) for a, b in zip(account['balances'], expected[account['id']])) < 1e-6
+
+
+def test_forecast_debt_payoff(client, ledger):
+    next_month = datetime.utcnow().date().replace(day=1) + relativedelta(months=1)
+    add_forecast_rules(client, ledger, next_month)
+    rules = client.get('/api/forecast', query_string={'months': 24}).get_json()['rules']
+    loan = next(rule for rule in rules if rule['name'] == 'Car loan')
+    # 850 left: eight payments of 100 and a last one of 50
+    assert (loan['occurrences'], loan['total'], loan['payoff_date']) == (
+        9, -850.0, (next_month + relativedelta(months=8)).isoformat())
+
+
+def test_forecast_rejects_horizons_past_the_limit(client, ledger):
+    assert client.get('/api/forecast', query_string={'months': 10000}).status_code == 400
+    assert client.get('/api/forecast', query_string={'account_id': -1}).status_code == 404
@@ -0,0 +1,74 @@
+"""The SQLite full-text index must hold every transaction, however it was inserted.
+
+FTS5 corrupts an external-content index without an error when it is told to
+delete a row it never indexed, which is what the delete trigger does for a
+transaction that was inserted unindexed.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+import sqlalchemy as sa
+
+import benchmarks
+import search
+from app import RecurringTransaction, Transaction, db, process_recurring_transactions
+
+
+@pytest.fixture
+def check_index(app):
+    if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        pytest.skip('PostgreSQL indexes the description column itself')
+
+    def check(account_id):
+        with app.app_context():
+            rows = db.session.execute(db.select(Transaction.id, Transaction.description)
+                                      .where(Transaction.account_id == account_id)).all()
+            assert rows
+            for transaction_id, description in rows:
+                condition = search.description_matches('sqlite', Transaction.description, Transaction.id,
+                                                       search.terms(description)[0])
+                assert db.session.scalar(db.select(Transaction.id).where(Transaction.id == transaction_id, condition))
+            # Editing and deleting makes the triggers remove each row from the index again
+            db.session.execute(db.update(Transaction).where(Transaction.account_id == account_id)
+                               .values(description=Transaction.description + ' edited'))
+            db.session.execute(db.delete(Transaction).where(Transaction.account_id == account_id))
+            db.session.execute(sa.text("INSERT INTO transaction_search (transaction_search) VALUES ('integrity-check')"))
+            db.session.rollback()
+    return check
+
+
+def test_orm_and_raw_inserts(app, ledger, check_index):
+    with app.app_context():
+        db.session.add(Transaction(description='Bakery', amount=-2.0, account_id=ledger.other_id))
+        db.session.flush()
+        db.session.execute(sa.text('INSERT INTO "transaction" (description, amount, date, account_id) '
+                                   "VALUES ('Kiosk', -1.0, '2024-01-01 00:00:00', :account_id)"),
+                           {'account_id': ledger.other_id})
+        db.session.commit()
+    check_index(ledger.main_id)
+    check_index(ledger.other_id)
+
+
+def test_batch_inserts(client, ledger, check_index):
+    response = client.post('/api/transactions/batch', json={'operations': [
+        {'op': 'create', 'account_id': ledger.other_id, 'description': f'Batched {i}', 'amount': -1.0}
+        for i in range(3)]})
+    assert [result['status'] for result in response.get_json()['results']] == [201] * 3
+    check_index(ledger.other_id)
+
+
+def test_imports(ledger, upload, tmp_path, check_index):
+    path = tmp_path / 'statement.html'
+    benchmarks.write_html_statement(path, 300)
+    assert upload(ledger.other_id, path)['inserted'] == 300
+    check_index(ledger.other_id)
+
+
+def test_recurring_posts(app, ledger, user_id, check_index):
+    start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=4)
+    with app.app_context():
+        db.session.add(RecurringTransaction(name='Gym', amount=-2.0, frequency='daily', start_date=start,
+                                            next_due_date=start, account_id=ledger.other_id, user_id=user_id))
+        db.session.commit()
+        process_recurring_transactions()
+    check_index(ledger.other_id)
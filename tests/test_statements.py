@@ -0,0 +1,75 @@
+import tracemalloc
+
+import pytest
+
+import benchmarks
+import statements
+
+HEADER = '<tr><th>Tarih</th><th>Açıklama</th><th>Tutar</th></tr>'
+ROW = '<tr><td>0{day}.01.2020</td><td>Kahve {day}</td><td>-{day},50</td></tr>'
+ROWS = ''.join(ROW.format(day=day) for day in range(1, 4))
+
+
+@pytest.mark.parametrize('document', [
+    f'<table>{HEADER}{ROWS}</table>',
+    # Headers in a first row of <td> cells
+    f"<table>{HEADER.replace('th>', 'td>')}{ROWS}</table>",
+    # Nested in a layout table, which matches first and whose own rows are no transactions
+    f'<table><tr><td>Hesap Özeti</td></tr><tr><td><table>{HEADER}{ROWS}</table></td></tr></table>',
+    # A row opened inside an open row waits for it
+    f'<table>{HEADER}<tr><td>01.01.2020</td><td>Dış<table>{ROWS}</table></td><td>1,00</td></tr></table>',
+    # Only the first matching table counts
+    f'<table><tr><td>Şube</td></tr></table><table>{HEADER}{ROWS}</table><table>{HEADER}{ROWS}</table>',
+    f'<table>{HEADER}{ROWS}',
+    '<table><tr><td>Şube</td></tr></table>',
+])
+def test_parsers_agree(tmp_path, document):
+    path = tmp_path / 'statement.html'
+    path.write_text(f'<html><body>{document}</body></html>', encoding='utf-8')
+
+    def parse(parser):
+        try:
+            return list(parser(path))
+        except statements.StatementError:
+            return None
+    assert parse(statements.parse_html_statement) == parse(statements.parse_html_statement_soup)
+
+
+def test_rows_come_as_they_close(tmp_path):
+    path = tmp_path / 'statement.html'
+    benchmarks.write_html_statement(path, 2000)
+    document = path.read_text(encoding='utf-8')
+    parser = statements.StatementTableParser()
+    parser.feed(document[:len(document) // 2])
+    assert parser.columns == (0, 1, 2)
+    assert 900 < len(parser.take_rows()) < 1100
+    parser.feed(document[len(document) // 2:])
+    parser.close()
+    assert parser.finished
+    assert 900 < len(parser.take_rows()) < 1100
+
+
+def test_memory_does_not_grow_with_rows(tmp_path):
+    path = tmp_path / 'statement.html'
+    benchmarks.write_html_statement(path, 5000)
+    tracemalloc.start()
+    try:
+        assert sum(1 for _ in statements.parse_html_statement(path)) == 5000
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # Holding every row takes ~8 MB
+    assert peak < 2 * 2 ** 20
+
+
+@pytest.mark.parametrize('encoding, declaration', [
+    ('utf-8', ''),
+    ('utf-8-sig', ''),
+    ('windows-1254', '<meta charset="windows-1254">'),
+    ('iso-8859-9', '<meta http-equiv="Content-Type" content="text/html; charset=iso-8859-9">'),
+])
+def test_encodings(tmp_path, encoding, declaration):
+    path = tmp_path / 'statement.html'
+    path.write_bytes(f'<html><head>{declaration}</head><body><table>{HEADER}'
+                     f'<tr><td>01.01.2020</td><td>Şişli Eczanesi</td><td>-1,00</td></tr></table>'.encode(encoding))
+    assert [tx['description'] for tx in statements.parse_html_statement(path)] == ['Şişli Eczanesi']
@@ -0,0 +1,126 @@
+from datetime import datetime
+
+import pytest
+
+import benchmarks
+import exports
+from app import EXPORT_COLUMNS
+
+
+def listed(client, account_id, **params):
+    response = client.get(f'/api/accounts/{account_id}/transactions', query_string=params)
+    assert response.status_code == 200
+    return [t['description'] for t in response.get_json()['transactions']]
+
+
+def batch(client, *operations):
+    response = client.post('/api/transactions/batch', json={'operations': operations})
+    assert response.status_code == 200
+    return [result['status'] for result in response.get_json()['results']], response.get_json()['results']
+
+
+def test_update_and_delete(client, ledger, assert_consistent):
+    assert client.put(f'/api/transactions/{ledger.ids[0]}', json={'description': 'Espresso', 'amount': -4.0}).status_code == 200
+    assert client.delete(f'/api/transactions/{ledger.ids[-1]}').status_code == 200
+    assert listed(client, ledger.main_id, search='espresso') == ['Espresso']
+    assert listed(client, ledger.main_id, search='groceries') == []
+    assert_consistent({ledger.main_id: 1000.0})
+
+
+def test_batch(client, ledger, assert_consistent):
+    statuses, results = batch(
+        client,
+        {'op': 'create', 'account_id': ledger.main_id, 'description': 'Batched one', 'amount': -5.0},
+        {'op': 'create', 'account_id': ledger.main_id, 'description': 'Batched two', 'amount': 7.5,
+         'category_id': ledger.food_id},
+        {'op': 'create', 'account_id': ledger.main_id, 'description': 'Batched three', 'amount': 'x'},
+        {'op': 'create', 'account_id': -1, 'description': 'Batched four', 'amount': 1.0})
+    assert statuses == [201, 201, 400, 404]
+    assert sorted(listed(client, ledger.main_id, search='batched')) == ['Batched one', 'Batched two']
+    one, two = results[0]['id'], results[1]['id']
+
+    statuses, _ = batch(client,
+                        {'op': 'update', 'id': one, 'description': 'Batched edit', 'amount': -6.0},
+                        {'op': 'recategorize', 'id': two, 'category_id': None},
+                        {'op': 'recategorize', 'id': one, 'category_id': ledger.food_id},
+                        {'op': 'delete', 'id': two},
+                        {'op': 'update', 'id': two, 'description': 'Gone', 'amount': 1.0},
+                        {'op': 'recategorize', 'id': ledger.ids[0], 'category_id': -1},
+                        {'op': 'merge', 'id': ledger.ids[0]})
+    assert statuses == [200, 200, 200, 200, 404, 404, 400]
+    assert listed(client, ledger.main_id, search='batched') == ['Batched edit']
+    assert sorted(listed(client, ledger.main_id, search='food')) == ['Batched edit', 'Groceries', 'Rent', 'Salary']
+
+    assert batch(client, {'op': 'delete', 'id': one})[1] == [{'status': 200, 'id': one}]
+    assert listed(client, ledger.main_id, search='batched') == []
+    assert_consistent({ledger.main_id: 1000.0})
+
+
+@pytest.mark.parametrize('body', [
+    {'json': [{'op': 'delete', 'id': 1}]},
+    {'json': 'operations'},
+    {'json': 42},
+    {'json': {}},
+    {'json': {'operations': []}},
+    {'json': {'operations': {'op': 'delete', 'id': 1}}},
+    {'data': 'not json', 'content_type': 'application/json'},
+])
+def test_batch_rejects_malformed_bodies(client, body):
+    response = client.post('/api/transactions/batch', **body)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Expected a non-empty list of operations'}
+
+
+@pytest.mark.parametrize('search, expected', [
+    ('coffee', ['Coffee']),  # Case-insensitive
+    ('sal', ['50% off_sale', 'Salary']),  # Word prefixes
+    ('off sale', ['50% off_sale']),  # Every word
+    ('food', ['Groceries', 'Rent', 'Salary']),  # Category names
+    ('%', ['50% off_sale']),  # Literally, not as LIKE wildcards
+    ('_', ['50% off_sale']),
+])
+def test_search(client, ledger, search, expected):
+    assert sorted(listed(client, ledger.main_id, search=search)) == expected
+
+
+def test_search_across_accounts(client, ledger):
+    client.post('/api/transactions', json={'account_id': ledger.other_id, 'description': 'Coffee beans', 'amount': -9.0})
+    found = client.get('/api/transactions/search', query_string={'search': 'cof'}).get_json()['transactions']
+    assert sorted((t['account'], t['description']) for t in found) == [('Main', 'Coffee'), ('Other', 'Coffee beans')]
+
+
+def test_filters(client, ledger):
+    today = datetime.utcnow().strftime('%Y-%m-%d')
+    assert sorted(listed(client, ledger.main_id, type='income')) == ['Refund', 'Salary']
+    assert sorted(listed(client, ledger.main_id, min_amount='10', max_amount='900')) == ['50% off_sale', 'Groceries', 'Refund', 'Rent']
+    assert len(listed(client, ledger.main_id, start_date=today, end_date=today)) == 6
+    assert listed(client, ledger.main_id, end_date='2000-01-01') == []
+
+
+@pytest.mark.parametrize('file_format', exports.FORMATS)
+def test_export(client, ledger, file_format):
+    today = datetime.utcnow().strftime('%Y-%m-%d')
+    response = client.get('/api/export', query_string={'format': file_format, 'account_id': ledger.main_id, 'search': 'sal'})
+    assert response.status_code == 200
+    assert benchmarks.read_export(file_format, response.data) == [
+        [name for name, width in EXPORT_COLUMNS],
+        [today, 'Main', 'Salary', 'Food & drinks', 2500.0],
+        [today, 'Main', '50% off_sale', None, -20.0],
+    ]
+
+
+def test_cursor_pagination(client, ledger):
+    seen, cursor = [], ''
+    while True:
+        page = client.get(f'/api/accounts/{ledger.main_id}/transactions',
+                          query_string={'page_size': 2, 'cursor': cursor}).get_json()
+        assert len(page['transactions']) <= 2
+        seen += [t['id'] for t in page['transactions']]
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+    assert sorted(seen) == sorted(ledger.ids)
+
+
+def test_account_details_page(client, ledger):
+    assert client.get(f'/account/{ledger.main_id}').status_code == 200